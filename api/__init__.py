@@ -1,6 +1,11 @@
-from flask import Blueprint
-from flask_jwt_extended import JWTManager
+import functools
 
+from flask import Blueprint, current_app, jsonify, make_response, request
+from flask_jwt_extended import JWTManager, get_jwt, get_jwt_identity, verify_jwt_in_request
+from sqlalchemy.orm import joinedload
+from werkzeug.local import LocalProxy
+
+from database.routing import has_replica
 from error_log import logger
 
 api = Blueprint('api', __name__)
@@ -36,7 +41,7 @@ def validate_user_credentials(body: dict):
     if not password:
         raise Exception('Password is required')
     from database.models import User
-    user = User.query.filter_by(username=username).first()
+    user = User.query.options(joinedload(User.role)).filter_by(username=username).first()
     if not user:
         raise Exception('User does not exist')
     if not user.check_password(password):
@@ -44,6 +49,99 @@ def validate_user_credentials(body: dict):
     return user
 
 
+def load_current_user():
+    """
+    Returns the user of the JWT verified for the current request, with its role.
+    The user is loaded at most once per request, with a single query, and only if a view actually needs it.
+    """
+    if not hasattr(request, 'current_user'):
+        from database.models import User
+        request.current_user = User.query.options(joinedload(User.role)).filter_by(id=get_jwt_identity()).first()
+    return request.current_user
+
+
+current_user = LocalProxy(load_current_user)
+
+
+def current_role():
+    role = get_jwt().get('role')
+    if role is None:
+        # tokens issued before the role claim was added
+        role = current_user.role.role_name
+    return role
+
+
+def role_required(*roles, message='Forbidden'):
+    """
+    Protects a view like :func:`jwt_required` and only lets callers with one of the given roles through,
+    the others get a 403 with the given message. The role is read from the claims of the JWT, so the check
+    does not touch the database.
+    """
+
+    def decorator(f):
+        @functools.wraps(f)
+        def decorated_function(*args, **kwargs):
+            verify_jwt_in_request()
+            if current_role() not in roles:
+                return make_response(jsonify({'message': message}), 403)
+            return f(*args, **kwargs)
+
+        return decorated_function
+
+    return decorator
+
+
+def primary_key(identity):
+    return 'primary:{}'.format(identity)
+
+
+def recently_wrote():
+    try:
+        verify_jwt_in_request(optional=True)
+        identity = get_jwt_identity()
+        if identity is None:
+            return False
+        from cache import cache
+        return cache.get(primary_key(identity)) is not None
+    except Exception as e:
+        # an invalid token is rejected by the view itself, and when in doubt the primary is always right
+        logger.error(e)
+        return True
+
+
+def read_only(f):
+    """
+    Sends the queries of a view to the read replica, if one is configured. Callers who wrote anything within the
+    last READ_YOUR_WRITES_WINDOW seconds keep reading from the primary, so they always see their own writes, and so
+    does a view under :func:`cache.cached` whose tags were invalidated within that window, so a response rendered
+    from a lagging replica is never cached under the version the write has just bumped.
+    """
+
+    @functools.wraps(f)
+    def decorated_function(*args, **kwargs):
+        request.read_only = has_replica() and not (getattr(request, 'tags_recently_written', False)
+                                                   or recently_wrote())
+        return f(*args, **kwargs)
+
+    return decorated_function
+
+
+@api.after_request
+def stick_to_primary(response):
+    if request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400 and has_replica():
+        try:
+            # the view may not have verified a JWT, and without one there is no caller to keep on the primary
+            verify_jwt_in_request(optional=True)
+            identity = get_jwt_identity()
+            if identity is not None:
+                from cache import cache
+                cache.set(primary_key(identity), 1, timeout=current_app.config['READ_YOUR_WRITES_WINDOW'])
+        except Exception as e:
+            # e.g. an expired token sent along with a login
+            logger.error(e)
+    return response
+
+
 @api.app_errorhandler(404)
 def not_found(e):
     logger.error(e)
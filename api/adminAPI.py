@@ -1,27 +1,25 @@
 from flask import jsonify, request, make_response, Blueprint
-from flask_jwt_extended import get_jwt_identity, jwt_required
 
 from database import db
-from database.models import Role, User, CategoryRequest, Category, ManagerCreationRequests
+from database.models import CategoryRequest, Category, ManagerCreationRequests
 from database.schema import UserSchema, CategoryRequestSchema, ManagerRequestSchema, CategorySchema
 from error_log import logger
-from mail import send_mail
-from mail.templates import manager_approved, manager_rejected
-from cache import cache
+from mail.tasks import queue_mail
+from mail.templates import render
+from cache import cached, invalidate, category_tags
+from . import role_required
 
 admin_blueprint = Blueprint('admin', __name__)
 
 
 @admin_blueprint.route('/approve_category/<int:category_request_id>', methods=['PUT'])
-@jwt_required()
+@role_required('admin', message='You are not authorized to approve categories')
 def approve_category(category_request_id):
     try:
-        current_user = User.query.get(get_jwt_identity())
-        if current_user.role.role_name != 'admin':
-            return make_response(jsonify({'message': 'You are not authorized to approve categories'}), 403)
         category_request = CategoryRequest.query.get(category_request_id)
         if category_request:
             category = category_request.approve()
+            invalidate(*category_tags(category.id))
             return make_response(
                 jsonify({'message': 'Category {} approved successfully'.format(category.category_name)}), 200)
         else:
@@ -32,12 +30,9 @@ def approve_category(category_request_id):
 
 
 @admin_blueprint.route('/reject_request/<int:request_id>', methods=['PUT'])
-@jwt_required()
+@role_required('admin', message='You are not authorized to reject categories')
 def reject_request(request_id):
     try:
-        current_user = User.query.get(get_jwt_identity())
-        if current_user.role.role_name != 'admin':
-            return make_response(jsonify({'message': 'You are not authorized to reject categories'}), 403)
         category_request = CategoryRequest.query.get(request_id)
         if category_request:
             category_request.reject()
@@ -51,15 +46,14 @@ def reject_request(request_id):
 
 
 @admin_blueprint.route('/approve_delete_category/<int:id>', methods=['POST'])
-@jwt_required()
+@role_required('admin', message='You are not authorized to approve categories')
 def approve_delete_category(id):
     try:
-        current_user = User.query.get(get_jwt_identity())
         category_request = CategoryRequest.query.get(id)
-        if current_user.role.role_name != 'admin':
-            return make_response(jsonify({'message': 'You are not authorized to approve categories'}), 403)
         if category_request:
             category = category_request.approve()
+            uncategorized = Category.query.filter_by(category_name='Uncategorized').first()
+            invalidate(*category_tags(category_request.category_id, uncategorized.id))
             return make_response(jsonify({'message': 'Category deleted successfully'}), 200)
         else:
             return make_response(jsonify({'message': 'Category request not found'}), 404)
@@ -69,13 +63,10 @@ def approve_delete_category(id):
 
 
 @admin_blueprint.route('/approve_update/<int:req_id>', methods=['POST'])
-@jwt_required()
+@role_required('admin', message='You are not authorized to approve categories')
 def approve_update(req_id):
     try:
-        current_user = User.query.get(get_jwt_identity())
         category_request = CategoryRequest.query.get(req_id)
-        if current_user.role.role_name != 'admin':
-            return make_response(jsonify({'message': 'You are not authorized to approve categories'}), 403)
         if category_request:
             if category_request.category_name == 'Uncategorized':
                 return make_response(jsonify({'message': 'Cannot update Uncategorized category'}), 400)
@@ -83,6 +74,7 @@ def approve_update(req_id):
             if duplicate_category and duplicate_category.id != category_request.category_id:
                 return make_response(jsonify({'message': 'Category already exists with the name ' + duplicate_category.category_name}), 400)
             category = category_request.approve()
+            invalidate(*category_tags(category.id))
             return make_response(jsonify({'message': 'Category updated successfully'}), 200)
         else:
             return make_response(jsonify({'message': 'Category request not found'}), 404)
@@ -92,13 +84,10 @@ def approve_update(req_id):
 
 
 @admin_blueprint.route('/get_category_requests', methods=['GET'])
-@jwt_required()
+@role_required('admin', message='You are not authorized to view category requests')
 def get_category_requests():
     category_request_schema = CategoryRequestSchema(many=True)
     try:
-        current_user = User.query.get(get_jwt_identity())
-        if current_user.role.role_name != 'admin':
-            return make_response(jsonify({'message': 'You are not authorized to view category requests'}), 403)
         category_requests = CategoryRequest.query.filter_by(approved=False).all()
         if category_requests:
             return make_response(jsonify({'message': 'Category requests fetched successfully',
@@ -113,12 +102,9 @@ def get_category_requests():
 
 
 @admin_blueprint.route('/category/<int:category_id>', methods=['DELETE'])
-@jwt_required()
+@role_required('admin', message='You are not authorized to delete categories')
 def delete_category(category_id):
     try:
-        current_user = User.query.get(get_jwt_identity())
-        if current_user.role.role_name != 'admin':
-            return make_response(jsonify({'message': 'You are not authorized to delete categories'}), 403)
         category = Category.query.get(category_id)
         if category and category.category_name != 'Uncategorized':
             products = category.products
@@ -129,6 +115,7 @@ def delete_category(category_id):
                 db.session.add_all(products)
             db.session.delete(category)
             db.session.commit()
+            invalidate(*category_tags(category_id, uncategorized.id))
             return make_response(jsonify({'message': 'Category deleted successfully'}), 200)
         elif category and category.category_name == 'Uncategorized':
             return make_response(jsonify({'message': 'Cannot delete Uncategorized category'}), 403)
@@ -140,12 +127,9 @@ def delete_category(category_id):
 
 
 @admin_blueprint.route('/update_category/<int:category_id>', methods=['PUT'])
-@jwt_required()
+@role_required('admin', message='You are not authorized to update categories')
 def update_category(category_id):
     try:
-        current_user = User.query.get(get_jwt_identity())
-        if current_user.role.role_name != 'admin':
-            return make_response(jsonify({'message': 'You are not authorized to update categories'}), 403)
         category = Category.query.get(category_id)
         body = request.get_json()
         if category:
@@ -166,6 +150,7 @@ def update_category(category_id):
                 category.category_description = body['category_description']
             db.session.add(category)
             db.session.commit()
+            invalidate(*category_tags(category_id))
             return make_response(jsonify({'message': 'Category updated successfully'}), 200)
         else:
             make_response(jsonify({'message': 'Category not found'}), 404)
@@ -175,14 +160,11 @@ def update_category(category_id):
 
 
 @admin_blueprint.route('/get_manager_requests', methods=['GET'])
-@jwt_required()
-@cache.cached(timeout=60)
+@role_required('admin', message='You are not authorized to view manager requests')
+@cached(timeout=60, tags=('manager_requests',))
 def get_manager_requests():
     manager_request_schema = ManagerRequestSchema(many=True)
     try:
-        current_user = User.query.get(get_jwt_identity())
-        if current_user.role.role_name != 'admin':
-            return make_response(jsonify({'message': 'You are not authorized to view manager requests'}), 403)
         manager_requests = ManagerCreationRequests.query.filter_by(approved=False).all()
         if manager_requests:
             return make_response(jsonify({'message': 'Manager requests fetched successfully',
@@ -196,20 +178,18 @@ def get_manager_requests():
 
 
 @admin_blueprint.route('/approve_manager_request/<int:manager_request_id>', methods=['PUT'])
-@jwt_required()
+@role_required('admin', message='You are not authorized to approve manager requests')
 def approve_manager(manager_request_id):
     try:
-        current_user = User.query.get(get_jwt_identity())
-        if current_user.role.role_name != 'admin':
-            return make_response(jsonify({'message': 'You are not authorized to approve manager requests'}), 403)
         manager_request = ManagerCreationRequests.query.get(manager_request_id)
         if manager_request:
             manager_request.approve()
-            send_mail(
+            invalidate('manager_requests')
+            queue_mail(
                 'Manager Request Approved',
                 'admin@grocerystore.com',
                 [manager_request.email],
-                html_body=manager_approved(manager_request.id, manager_request.username)
+                **render('manager_approved', user_id=manager_request.id, username=manager_request.username)
             )
             return make_response(jsonify({'message': 'Manager request approved successfully'}), 200)
         else:
@@ -220,20 +200,18 @@ def approve_manager(manager_request_id):
 
 
 @admin_blueprint.route('/reject_manager_request/<int:manager_request_id>', methods=['PUT'])
-@jwt_required()
+@role_required('admin', message='You are not authorized to reject manager requests')
 def reject_manager(manager_request_id):
     try:
-        current_user = User.query.get(get_jwt_identity())
-        if current_user.role.role_name != 'admin':
-            return make_response(jsonify({'message': 'You are not authorized to reject manager requests'}), 403)
         manager_request = ManagerCreationRequests.query.get(manager_request_id)
         if manager_request:
             manager_request.reject()
-            send_mail(
+            invalidate('manager_requests')
+            queue_mail(
                 'Manager Request Rejected',
                 'admin@grocerystore.com',
                 [manager_request.email],
-                html_body=manager_rejected()
+                **render('manager_rejected')
             )
             return make_response(jsonify({'message': 'Manager request rejected successfully'}), 200)
         else:
@@ -244,17 +222,15 @@ def reject_manager(manager_request_id):
 
 
 @admin_blueprint.route('/create_category', methods=['POST'])
-@jwt_required()
+@role_required('admin', message='You are not authorized to create categories')
 def create_category():
     category_schema = CategorySchema(many=False)
     try:
-        current_user = User.query.get(get_jwt_identity())
-        if current_user.role.role_name != 'admin':
-            return make_response(jsonify({'message': 'You are not authorized to create categories'}), 403)
         body = request.get_json()
         category = category_schema.load(body)
         db.session.add(category)
         db.session.commit()
+        invalidate(*category_tags(category.id))
         return make_response(jsonify({'message': 'Category created successfully'}), 201)
     except Exception as e:
         logger.error(e)
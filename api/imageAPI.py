@@ -1,51 +1,77 @@
-import os
+from urllib.parse import urljoin
 
-from flask import jsonify, request, make_response, Blueprint
-from flask_jwt_extended import get_jwt_identity, jwt_required
+from flask import jsonify, request, make_response, Blueprint, current_app
+from sqlalchemy.exc import IntegrityError
+from werkzeug.exceptions import NotFound, RequestEntityTooLarge
 
 from database import db
-from database.models import User, ProductImage
+from database.models import ProductImage
 from database.schema import ProductImageSchema
 from error_log import logger
+from cache import invalidate
+from scheduled_jobs import enqueue
+from scheduled_jobs.images import process_product_image
+from storage import IMAGES, get_storage, key
+from storage.delivery import image_url
+from storage.variants import WIDTHS, FORMATS, deliver_variant
+from . import role_required
 
 image_blueprint = Blueprint('image', __name__)
 
 
+def image_response(image, message, status):
+    url = urljoin(request.host_url, image_url(image.image_name))
+    return make_response(jsonify({'message': message,
+                                  'image': {'id': image.id, 'status': image.status, 'url': url}}),
+                         status)
+
+
 @image_blueprint.route('/upload', methods=['POST'])
-@jwt_required()
+@role_required('admin', 'manager', message='You are not authorized to upload images')
 def upload_image():
     image_schema = ProductImageSchema(many=False)
     try:
-        current_user = User.query.get(get_jwt_identity())
-        if current_user.role.role_name not in ['admin', 'manager']:
-            return make_response(jsonify({'message': 'You are not authorized to upload images'}), 403)
         files = request.files
         if 'image' not in files:
             return make_response(jsonify({'message': 'Image not found in request'}), 400)
         image_file = files['image']
         image = image_schema.load({'image_file': image_file})
-        db.session.add(image)
-        db.session.commit()
-        return make_response(jsonify({'message': 'Image uploaded successfully',
-                                      'image':{'id':image.id ,'url':"http://localhost:5000/static/images"+image.image_name}}), 201)
+        if image.id is not None:
+            return image_response(image, 'Image already uploaded', 200)
+        try:
+            db.session.add(image)
+            db.session.commit()
+        except IntegrityError:
+            # the same image was uploaded concurrently
+            db.session.rollback()
+            image = ProductImage.query.filter_by(original_name=image.original_name).first()
+            return image_response(image, 'Image already uploaded', 200)
+        try:
+            enqueue(process_product_image, image.id)
+        except Exception as e:
+            # picked up later by process_pending_images
+            logger.error(e)
+        return image_response(image, 'Image uploaded successfully, renditions are being processed', 201)
+    except RequestEntityTooLarge:
+        return make_response(jsonify({'message': 'Image file must be less than 2MB'}), 413)
     except Exception as e:
         logger.error(e)
         return make_response(jsonify({'message': str(e)}), 400)
 
 
 @image_blueprint.route('/delete/<int:image_id>', methods=['DELETE'])
-@jwt_required()
+@role_required('admin', 'manager', message='You are not authorized to delete images')
 def delete_image(image_id):
     try:
-        current_user = User.query.get(get_jwt_identity())
-        if current_user.role.role_name not in ['admin', 'manager']:
-            return make_response(jsonify({'message': 'You are not authorized to delete images'}), 403)
         image = ProductImage.query.get(image_id)
         if image:
             if image.image_name != 'default.png':
-                os.remove(os.path.join(os.getcwd(), 'static', 'images', image.image_name))
+                storage = get_storage()
+                for name in image.file_names() - image.shared_file_names():
+                    storage.delete(key(IMAGES, name))
                 db.session.delete(image)
                 db.session.commit()
+                invalidate('catalog')
                 return make_response(jsonify({'message': 'Image deleted successfully'}), 200)
             else:
                 return make_response(jsonify({'message': 'Cannot delete default image'}), 403)
@@ -54,3 +80,25 @@ def delete_image(image_id):
     except Exception as e:
         logger.error(e)
         return make_response(jsonify({'message': str(e)}), 400)
+
+
+@image_blueprint.route('/<int:image_id>/resize', methods=['GET'])
+def resize_image(image_id):
+    try:
+        width = request.args.get('width', type=int)
+        image_format = request.args.get('format', 'webp')
+        if width not in WIDTHS:
+            return make_response(jsonify({'message': 'width must be one of {}'.format(list(WIDTHS))}), 400)
+        if image_format not in FORMATS:
+            return make_response(jsonify({'message': 'format must be one of {}'.format(list(FORMATS))}), 400)
+        image = ProductImage.query.get(image_id)
+        if not image:
+            return make_response(jsonify({'message': 'Image not found'}), 404)
+        return deliver_variant(image.original_name or image.image_name, width, image_format,
+                               current_app.config['IMAGE_VARIANT_DIR'], current_app.config['IMAGE_VARIANT_CACHE_BYTES'],
+                               max_age=24 * 60 * 60)
+    except NotFound:
+        return make_response(jsonify({'message': 'Image not found'}), 404)
+    except Exception as e:
+        logger.error(e)
+        return make_response(jsonify({'message': str(e)}), 400)
@@ -1,10 +1,11 @@
 from flask import jsonify, request, make_response, Blueprint
-from flask_jwt_extended import create_access_token, get_jwt_identity, jwt_required
+from flask_jwt_extended import create_access_token, jwt_required
+from sqlalchemy.orm import joinedload
 
 from database.models import User, ManagerCreationRequests
 from database.schema import UserSchema
 from error_log import logger
-from . import validate_user_credentials
+from . import validate_user_credentials, current_user
 
 login_blueprint = Blueprint('login', __name__)
 
@@ -16,7 +17,7 @@ def user_login():
         user = validate_user_credentials(body)
         if not user.role.role_name == 'user':
             return make_response(jsonify({'message': 'Only users can login here.'}), 403)
-        access_token = create_access_token(identity=user.id)
+        access_token = create_access_token(identity=user.id, additional_claims={'role': user.role.role_name})
         return jsonify(access_token=access_token)
     except Exception as e:
         logger.error(e)
@@ -30,7 +31,7 @@ def admin_login():
         user = validate_user_credentials(body)
         if not user.role.role_name == 'admin':
             return make_response(jsonify({'message': 'Only admins can login here.'}), 403)
-        access_token = create_access_token(identity=user.id)
+        access_token = create_access_token(identity=user.id, additional_claims={'role': user.role.role_name})
         return jsonify(access_token=access_token)
     except Exception as e:
         logger.error(e)
@@ -41,7 +42,7 @@ def admin_login():
 def manager_login():
     try:
         body = request.get_json()
-        user = User.query.filter_by(username=body['username']).first()
+        user = User.query.options(joinedload(User.role)).filter_by(username=body['username']).first()
         manager_request = ManagerCreationRequests.query.filter_by(username=body['username']).first()
         if not user:
             if not manager_request:
@@ -52,7 +53,7 @@ def manager_login():
             return make_response(jsonify({'message': 'Password is incorrect'}), 400)
         if not user.role.role_name == 'manager':
             return make_response(jsonify({'message': 'Only managers can login here.'}), 403)
-        access_token = create_access_token(identity=user.id)
+        access_token = create_access_token(identity=user.id, additional_claims={'role': user.role.role_name})
         return jsonify(access_token=access_token)
     except Exception as e:
         logger.error(e)
@@ -63,9 +64,7 @@ def manager_login():
 @jwt_required()
 def check_token(user_type):
     try:
-        user_id = get_jwt_identity()
-        user = User.query.filter_by(id=user_id).first()
-        if user and user.role.role_name == user_type:
+        if current_user and current_user.role.role_name == user_type:
             return make_response(jsonify({'message': 'Token is valid'}), 200)
         else:
             return make_response(jsonify({'message': 'Token is invalid'}), 400)
@@ -78,9 +77,7 @@ def check_token(user_type):
 def get_user():
     user_schema = UserSchema()
     try:
-        user_id = get_jwt_identity()
-        user = User.query.filter_by(id=user_id).first()
-        user = user_schema.dump(user)
+        user = user_schema.dump(current_user)
         return make_response(jsonify(user), 200)
     except Exception as e:
         logger.error(e)
@@ -1,14 +1,18 @@
-from flask import jsonify, request, make_response, Blueprint, send_file
-from flask_jwt_extended import get_jwt_identity, jwt_required
+from flask import jsonify, request, make_response, Blueprint
+from flask_jwt_extended import get_jwt_identity
 
-from database import db
-from database.models import Product, User, Category, CategoryRequest
+from database import db, loaders
+from database.models import Product, Category, CategoryRequest
 from database.schema import ProductSchema, UserSchema, CategoryRequestSchema, ManagerRequestSchema
+from database.serializers import product_serializer, json_response
 from error_log import logger
-from mail import send_mail
-from mail.templates import manager_created
-from cache import cache
+from mail.tasks import queue_mail
+from mail.templates import render
+from cache import cached, invalidate
+from . import role_required, read_only, current_user
 from scheduled_jobs.export import export_product_as_csv
+from storage import EXPORTS, get_storage, key
+from storage.delivery import deliver_stored
 
 manager_blueprint = Blueprint('manager', __name__)
 
@@ -21,10 +25,11 @@ def create_manager_request():
         manager_request = manager_request_schema.load(body)
         db.session.add(manager_request)
         db.session.commit()
-        send_mail(subject='Manager Request Created',
-                  sender='admin@grocerystore.com',
-                  recipients=[manager_request.email],
-                  html_body=manager_created(manager_request.username))
+        invalidate('manager_requests')
+        queue_mail(subject='Manager Request Created',
+                   sender='admin@grocerystore.com',
+                   recipients=[manager_request.email],
+                   **render('manager_created', username=manager_request.username))
         return make_response(jsonify({'message': 'Manager request created successfully, wait for approval'}), 200)
     except Exception as e:
         logger.error(e)
@@ -32,17 +37,15 @@ def create_manager_request():
 
 
 @manager_blueprint.route('/get_products', methods=['GET'])
-@cache.cached(timeout=60)
-@jwt_required()
+@cached(timeout=60, tags=('catalog',), per_identity=True)
+@read_only
+@role_required('manager')
 def get_products():
     try:
-        current_user = User.query.get(get_jwt_identity())
-        if not current_user.role.role_name == 'manager':
-            return make_response(jsonify({'message': 'Forbidden'}), 403)
-        products = Product.query.filter_by(added_by=get_jwt_identity()).all()
+        products = Product.query.options(*loaders.PRODUCT).filter_by(added_by=get_jwt_identity()).all()
         if products:
-            return make_response(jsonify({'message': 'Products fetched successfully',
-                                          'products': ProductSchema().dump(products, many=True)}),
+            return json_response({'message': 'Products fetched successfully',
+                                  'products': product_serializer.dump(products, many=True)},
                                  200)
         else:
             return make_response(jsonify({'message': 'No products found'}), 404)
@@ -52,42 +55,34 @@ def get_products():
 
 
 @manager_blueprint.route('/request_category', methods=['POST'])
-@jwt_required()
+@role_required('manager', message='Only managers can request new categories')
 def request_category():
     category_request_schema = CategoryRequestSchema(many=False)
     try:
-        current_user = User.query.get(get_jwt_identity())
-        if current_user.role.role_name == 'manager':
-            body = request.get_json()
-            body["user_id"] = current_user.id
-            body["request_type"] = 'add'
-            if Category.query.filter_by(category_name=body["category_name"].lower()).first():
-                return make_response(jsonify({'message': 'Category already exists with the name ' + body["category_name"]}), 400)
-            elif CategoryRequest.query.filter_by(category_name=body["category_name"].lower()).first():
-                return make_response(jsonify({'message': 'Category already requested with the name ' + body["category_name"]}), 400)
-            else:
-                category_request = category_request_schema.load(body)
-                db.session.add(category_request)
-                db.session.commit()
-                return make_response(jsonify({'message': 'Category requested successfully, wait for approval'}), 200)
+        body = request.get_json()
+        body["user_id"] = get_jwt_identity()
+        body["request_type"] = 'add'
+        if Category.query.filter_by(category_name=body["category_name"].lower()).first():
+            return make_response(jsonify({'message': 'Category already exists with the name ' + body["category_name"]}), 400)
+        elif CategoryRequest.query.filter_by(category_name=body["category_name"].lower()).first():
+            return make_response(jsonify({'message': 'Category already requested with the name ' + body["category_name"]}), 400)
         else:
-            return make_response(jsonify({'message': 'Only managers can request new categories'}), 403)
+            category_request = category_request_schema.load(body)
+            db.session.add(category_request)
+            db.session.commit()
+            return make_response(jsonify({'message': 'Category requested successfully, wait for approval'}), 200)
     except Exception as e:
         logger.error(e)
         return make_response(jsonify({'message': str(e)}), 400)
 
 
 @manager_blueprint.route('/', methods=['GET'])
-@jwt_required()
+@role_required('manager')
 def get_manager():
     user_schema = UserSchema()
     try:
-        user_id = get_jwt_identity()
-        user = User.query.filter_by(id=user_id).first()
-        if not user.role.role_name == 'manager':
-            return make_response(jsonify({'message': 'Forbidden'}), 403)
-        products = Product.query.filter_by(added_by=user_id).all()
-        user = user_schema.dump(user)
+        products = Product.query.options(*loaders.PRODUCT).filter_by(added_by=get_jwt_identity()).all()
+        user = user_schema.dump(current_user)
         user['products'] = ProductSchema().dump(products, many=True)
         return make_response(jsonify(user), 200)
     except Exception as e:
@@ -96,65 +91,57 @@ def get_manager():
 
 
 @manager_blueprint.route('/delete_category/<int:cat_id>',methods=['POST'])
-@jwt_required()
+@role_required('manager', message='Only managers can request to delete a category.')
 def request_delete_category(cat_id):
     category_request_schema = CategoryRequestSchema(many=False)
     try:
-        current_user = User.query.get(get_jwt_identity())
         category = Category.query.get(cat_id)
         uncategorized = Category.query.filter_by(category_name='Uncategorized').first()
-        if current_user.role.role_name == 'manager':
-            if not category:
-                return make_response(jsonify({'message': 'Category not found'}), 404)
-            elif category.id == uncategorized.id:
-                return make_response(jsonify({'message': 'You cannot delete this category'}), 400)
-            elif category.id in [i.category_id for i in CategoryRequest.query.filter_by(request_type='delete').all()]:
-                return make_response(jsonify({'message': 'Category deletion request already exists'}), 400)
-            else:
-                body = dict()
-                body['user_id'] = current_user.id
-                body['request_type'] = 'delete'
-                body['category_id'] = category.id
-                body['category_name'] = category.category_name
-                body['category_description'] = category.category_description
-                category_request = category_request_schema.load(body)
-                db.session.add(category_request)
-                db.session.commit()
-                return make_response(jsonify(
-                    {'message': 'Category deletion request created successfully, wait for approval'}), 200)
+        if not category:
+            return make_response(jsonify({'message': 'Category not found'}), 404)
+        elif category.id == uncategorized.id:
+            return make_response(jsonify({'message': 'You cannot delete this category'}), 400)
+        elif category.id in [i.category_id for i in CategoryRequest.query.filter_by(request_type='delete').all()]:
+            return make_response(jsonify({'message': 'Category deletion request already exists'}), 400)
         else:
-            return make_response(jsonify({'message': 'Only managers can request to delete a category.'}), 403)
+            body = dict()
+            body['user_id'] = get_jwt_identity()
+            body['request_type'] = 'delete'
+            body['category_id'] = category.id
+            body['category_name'] = category.category_name
+            body['category_description'] = category.category_description
+            category_request = category_request_schema.load(body)
+            db.session.add(category_request)
+            db.session.commit()
+            return make_response(jsonify(
+                {'message': 'Category deletion request created successfully, wait for approval'}), 200)
     except Exception as e:
         logger.error(e)
         return make_response(jsonify({'message': str(e)}), 400)
 
 
 @manager_blueprint.route('/update_category/<int:cat_id>',methods=['POST'])
-@jwt_required()
+@role_required('manager', message='Only managers can request to update a category.')
 def update_category(cat_id):
     category_request_schema = CategoryRequestSchema(many=False)
     try:
-        current_user = User.query.get(get_jwt_identity())
         category = Category.query.get(cat_id)
         uncategorized = Category.query.filter_by(category_name='Uncategorized').first()
-        if current_user.role.role_name == 'manager':
-            if not category:
-                return make_response(jsonify({'message': 'Category not found'}), 404)
-            elif category.id == uncategorized.id:
-                return make_response(jsonify({'message': 'You cannot update this category'}), 400)
-            elif category.id in [i.category_id for i in CategoryRequest.query.filter_by(request_type='update').all()]:
-                return make_response(jsonify({'message': 'Category update request already exists'}), 400)
-            else:
-                body = request.get_json()
-                body['user_id'] = current_user.id
-                body['request_type'] = 'update'
-                category_request = category_request_schema.load(body)
-                db.session.add(category_request)
-                db.session.commit()
-                return make_response(jsonify(
-                    {'message': 'Category update request created successfully, wait for approval'}), 200)
+        if not category:
+            return make_response(jsonify({'message': 'Category not found'}), 404)
+        elif category.id == uncategorized.id:
+            return make_response(jsonify({'message': 'You cannot update this category'}), 400)
+        elif category.id in [i.category_id for i in CategoryRequest.query.filter_by(request_type='update').all()]:
+            return make_response(jsonify({'message': 'Category update request already exists'}), 400)
         else:
-            return make_response(jsonify({'message': 'Only managers can request to update a category.'}), 403)
+            body = request.get_json()
+            body['user_id'] = get_jwt_identity()
+            body['request_type'] = 'update'
+            category_request = category_request_schema.load(body)
+            db.session.add(category_request)
+            db.session.commit()
+            return make_response(jsonify(
+                {'message': 'Category update request created successfully, wait for approval'}), 200)
     except Exception as e:
         logger.error(e)
         return make_response(jsonify({'message': str(e)}), 400)
@@ -162,62 +149,54 @@ def update_category(cat_id):
 
 
 @manager_blueprint.route('/export_product/<int:product_id>', methods=['GET'])
-@jwt_required()
+@role_required('manager', message='Only managers can request csv for a product.')
 def request_product_csv(product_id):
     try:
-        current_user = User.query.get(get_jwt_identity())
-        if current_user.role.role_name == 'manager':
-            product = Product.query.get(product_id)
-            if not product:
-                return make_response(jsonify({'message': 'Product not found'}), 404)
-            elif product.added_by != current_user.id:
-                return make_response(jsonify({'message': 'You cannot request csv for this product'}), 400)
-            else:
-                task = export_product_as_csv.delay(product_id)
-                return make_response(jsonify({'message': 'CSV requested successfully, wait a moment','taskID':task.id}), 200)
+        product = Product.query.get(product_id)
+        if not product:
+            return make_response(jsonify({'message': 'Product not found'}), 404)
+        elif product.added_by != get_jwt_identity():
+            return make_response(jsonify({'message': 'You cannot request csv for this product'}), 400)
         else:
-            return make_response(jsonify({'message': 'Only managers can request csv for a product.'}), 403)
+            task = export_product_as_csv.delay(product_id)
+            return make_response(jsonify({'message': 'CSV requested successfully, wait a moment','taskID':task.id}), 200)
     except Exception as e:
         logger.error(e)
         return make_response(jsonify({'message': str(e)}), 400)
 
 
 @manager_blueprint.route('/task_status/<string:task_id>', methods=['GET'])
-@jwt_required()
+@role_required('manager', message='Only managers can request csv for a product.')
 def request_product_csv_status(task_id):
     try:
-        current_user = User.query.get(get_jwt_identity())
-        if current_user.role.role_name == 'manager':
-            task = export_product_as_csv.AsyncResult(task_id)
-            if task.state == 'PENDING':
-                return make_response(jsonify({'message': 'Task pending', 'status':task.state}), 200)
-            elif task.state == 'SUCCESS':
-                return make_response(jsonify({'message': 'Task completed','status':task.state}), 200)
-            elif task.state == 'FAILURE':
-                print("Task failed")
-                return make_response(jsonify({'message': 'Task failed','status':task.state}), 400)
-            else:
-                return make_response(jsonify({'message': 'Task running','status':task.state}), 200)
+        task = export_product_as_csv.AsyncResult(task_id)
+        if task.state == 'PENDING':
+            return make_response(jsonify({'message': 'Task pending', 'status':task.state}), 200)
+        elif task.state == 'SUCCESS':
+            return make_response(jsonify({'message': 'Task completed','status':task.state}), 200)
+        elif task.state == 'FAILURE':
+            print("Task failed")
+            return make_response(jsonify({'message': 'Task failed','status':task.state}), 400)
         else:
-            return make_response(jsonify({'message': 'Only managers can request csv for a product.'}), 403)
+            return make_response(jsonify({'message': 'Task running','status':task.state}), 200)
     except Exception as e:
         logger.error(e)
         return make_response(jsonify({'message': str(e)}), 400)
 
 
 @manager_blueprint.route('/csv_download/<string:product_id>', methods=['GET'])
-@jwt_required()
+@role_required('manager', message='Only managers can request csv for a product.')
 def csv_download(product_id):
     try:
-        current_user = User.query.get(get_jwt_identity())
-        if current_user.role.role_name == 'manager':
-            product = Product.query.get(product_id)
-            if product:
-                return send_file('/static/products/{}.csv'.format(product.id), as_attachment=True)
-            else:
-                return make_response(jsonify({'message': 'Product not found'}), 404)
+        product = Product.query.get(product_id)
+        if product:
+            export = key(EXPORTS, '{}.csv'.format(product.id))
+            if not get_storage().exists(export):
+                return make_response(jsonify({'message': 'CSV not exported yet, request an export first'}), 404)
+            return deliver_stored(export, mimetype='text/csv', as_attachment=True,
+                                  download_name='product_{}.csv'.format(product.id), private=True)
         else:
-            return make_response(jsonify({'message': 'Only managers can request csv for a product.'}), 403)
+            return make_response(jsonify({'message': 'Product not found'}), 404)
     except Exception as e:
         logger.error(e)
         return make_response(jsonify({'message': str(e)}), 400)
\ No newline at end of file
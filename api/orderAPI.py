@@ -1,53 +1,71 @@
 from flask import jsonify, request, make_response, Blueprint
-from flask_jwt_extended import get_jwt_identity, jwt_required
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy.exc import NoResultFound
 
-from database import db
-from database.models import User, Order, Product
-from database.schema import OrderSchema
+from database import db, loaders
+from database.models import Order, Product
+from database.schema import OrderSchema, CartSchema
+from database.serializers import order_serializer, json_response
 from error_log import logger
-from cache import cache
+from cache import cached, invalidate, product_tags
+from . import role_required, read_only
 
 order_blueprint = Blueprint('order', __name__)
 
 
 @order_blueprint.route('/place_order', methods=['POST'])
-@jwt_required()
+@role_required('user', message='You are not authorized to place orders')
 def place_order():
     order_schema = OrderSchema(many=False)
     try:
-        current_user = User.query.get(get_jwt_identity())
+        user_id = get_jwt_identity()
         body = request.get_json()
-        if current_user.role.role_name == "user":
-            body['user_id'] = current_user.id
-            product = Product.query.get(body['product_id'])
-            if product:
-                if product.current_stock >= body['quantity']:
-                    order = order_schema.load(body)
-                    return make_response(jsonify({'message': 'Order placed successfully',
-                                                  'order': order_schema.dump(order)}),
-                                         201)
-                else:
-                    return make_response(jsonify({'message': 'Not enough stock available'}), 400)
+        body['user_id'] = user_id
+        product = Product.query.get(body['product_id'])
+        if product:
+            if product.current_stock >= body['quantity']:
+                order = order_schema.load(body)
+                invalidate('user:{}:orders'.format(user_id), *product_tags(order.product))
+                return make_response(jsonify({'message': 'Order placed successfully',
+                                              'order': order_schema.dump(order)}),
+                                     201)
             else:
-                return make_response(jsonify({'message': 'Product not found'}), 404)
-
+                return make_response(jsonify({'message': 'Not enough stock available'}), 400)
         else:
-            return make_response(jsonify({'message': 'You are not authorized to place orders'}), 403)
+            return make_response(jsonify({'message': 'Product not found'}), 404)
+    except Exception as e:
+        logger.error(e)
+        return make_response(jsonify({'message': str(e)}), 400)
+
+
+@order_blueprint.route('/place_orders', methods=['POST'])
+@role_required('user', message='You are not authorized to place orders')
+def place_orders():
+    try:
+        user_id = get_jwt_identity()
+        cart = CartSchema().load(request.get_json())
+        order_ids = Order.place_many(user_id, cart['items'])
+        orders = Order.query.options(*loaders.ORDER).filter(Order.id.in_(order_ids)).order_by(Order.id).all()
+        invalidate('user:{}:orders'.format(user_id), *product_tags(*[order.product for order in orders]))
+        return json_response({'message': 'Orders placed successfully',
+                              'orders': order_serializer.dump(orders, many=True)},
+                             201)
+    except NoResultFound as e:
+        return make_response(jsonify({'message': str(e)}), 404)
     except Exception as e:
         logger.error(e)
         return make_response(jsonify({'message': str(e)}), 400)
 
 
 @order_blueprint.route('/get_order/<int:order_id>', methods=['GET'])
-@cache.cached(timeout=60)
-@jwt_required()
+@cached(timeout=60, tags=('user:{identity}:orders',), per_identity=True)
+@role_required('user', message='You are not authorized to view this order')
 def get_order(order_id):
     order_schema = OrderSchema(many=False)
     try:
-        current_user = User.query.get(get_jwt_identity())
-        order = Order.query.get(order_id)
+        order = Order.query.options(*loaders.ORDER).get(order_id)
         if order:
-            if current_user.role.role_name == "user" and order.user_id == current_user.id:
+            if order.user_id == get_jwt_identity():
                 return make_response(jsonify({'message': 'Order fetched successfully',
                                               'order': order_schema.dump(order)}),
                                      200)
@@ -61,44 +79,38 @@ def get_order(order_id):
 
 
 @order_blueprint.route('/unconfirmed', methods=['GET'])
-@cache.cached(timeout=60)
-@jwt_required()
+@cached(timeout=60, tags=('user:{identity}:orders',), per_identity=True)
+@read_only
+@role_required('user', message='You are not authorized to view orders')
 def get_unconfirmed():
-    order_schema = OrderSchema(many=True)
     try:
-        current_user = User.query.get(get_jwt_identity())
-        if current_user.role.role_name == "user":
-            orders = Order.query.filter_by(user_id=current_user.id).filter_by(confirmed=False).all()
-            if orders:
-                return make_response(jsonify({'message': 'Orders fetched successfully',
-                                              'orders': order_schema.dump(orders, many=True)}),
-                                     200)
-            else:
-                return make_response(jsonify({'message': 'No orders found'}), 404)
+        orders = (Order.query.options(*loaders.ORDER)
+                  .filter_by(user_id=get_jwt_identity()).filter_by(confirmed=False).all())
+        if orders:
+            return json_response({'message': 'Orders fetched successfully',
+                                  'orders': order_serializer.dump(orders, many=True)},
+                                 200)
         else:
-            return make_response(jsonify({'message': 'You are not authorized to view orders'}), 403)
+            return make_response(jsonify({'message': 'No orders found'}), 404)
     except Exception as e:
         logger.error(e)
         return make_response(jsonify({'message': str(e)}), 400)
 
 
 @order_blueprint.route('/confirmed', methods=['GET'])
-@cache.cached(timeout=60)
-@jwt_required()
+@cached(timeout=60, tags=('user:{identity}:orders',), per_identity=True)
+@read_only
+@role_required('user', message='You are not authorized to view orders')
 def get_confirmed():
-    order_schema = OrderSchema(many=True)
     try:
-        current_user = User.query.get(get_jwt_identity())
-        if current_user.role.role_name == "user":
-            orders = Order.query.filter_by(user_id=current_user.id).filter_by(confirmed=True).all()
-            if orders:
-                return make_response(jsonify({'message': 'Orders fetched successfully',
-                                              'orders': order_schema.dump(orders, many=True)}),
-                                     200)
-            else:
-                return make_response(jsonify({'message': 'No orders found'}), 404)
+        orders = (Order.query.options(*loaders.ORDER)
+                  .filter_by(user_id=get_jwt_identity()).filter_by(confirmed=True).all())
+        if orders:
+            return json_response({'message': 'Orders fetched successfully',
+                                  'orders': order_serializer.dump(orders, many=True)},
+                                 200)
         else:
-            return make_response(jsonify({'message': 'You are not authorized to view orders'}), 403)
+            return make_response(jsonify({'message': 'No orders found'}), 404)
     except Exception as e:
         logger.error(e)
         return make_response(jsonify({'message': str(e)}), 400)
@@ -107,112 +119,97 @@ def get_confirmed():
 
 
 @order_blueprint.route('/cancel_order/<int:order_id>', methods=['DELETE'])
-@jwt_required()
+@role_required('user', message='You are not authorized to cancel orders')
 def cancel_order(order_id):
     try:
-        current_user = User.query.get(get_jwt_identity())
-        if current_user.role.role_name == "user":
-            order = Order.query.get(order_id)
-            if order:
-                if order.confirmed:
-                    return make_response(jsonify({'message': 'Order already confirmed, cannot cancel'}), 400)
-                elif order.user_id == current_user.id:
-                    order.delete()
-                    return make_response(jsonify({'message': 'Order cancelled successfully'}), 200)
-                else:
-                    return make_response(jsonify({'message': 'You are not authorized to cancel this order'}), 403)
+        user_id = get_jwt_identity()
+        order = Order.query.get(order_id)
+        if order:
+            if order.confirmed:
+                return make_response(jsonify({'message': 'Order already confirmed, cannot cancel'}), 400)
+            elif order.user_id == user_id:
+                tags = product_tags(order.product)
+                order.delete()
+                invalidate('user:{}:orders'.format(user_id), *tags)
+                return make_response(jsonify({'message': 'Order cancelled successfully'}), 200)
             else:
-                return make_response(jsonify({'message': 'Order not found'}), 404)
+                return make_response(jsonify({'message': 'You are not authorized to cancel this order'}), 403)
         else:
-            return make_response(jsonify({'message': 'You are not authorized to cancel orders'}), 403)
+            return make_response(jsonify({'message': 'Order not found'}), 404)
     except Exception as e:
         logger.error(e)
         return make_response(jsonify({'message': str(e)}), 400)
 
 
 @order_blueprint.route('/cancel_all', methods=['DELETE'])
-@jwt_required()
+@role_required('user', message='You are not authorized to cancel orders')
 def cancel_all():
     try:
-        current_user = User.query.get(get_jwt_identity())
-        if current_user.role.role_name == "user":
-            orders = Order.query.filter_by(user_id=current_user.id).filter_by(confirmed=False).all()
-            if orders:
-                for order in orders:
-                    order.delete()
-                return make_response(jsonify({'message': 'Orders cancelled successfully'}), 200)
-            else:
-                return make_response(jsonify({'message': 'No orders found'}), 404)
+        user_id = get_jwt_identity()
+        products = Order.cancel_all(user_id)
+        if products:
+            invalidate('user:{}:orders'.format(user_id), *product_tags(*products))
+            return make_response(jsonify({'message': 'Orders cancelled successfully'}), 200)
         else:
-            return make_response(jsonify({'message': 'You are not authorized to cancel orders'}), 403)
+            return make_response(jsonify({'message': 'No orders found'}), 404)
     except Exception as e:
         logger.error(e)
         return make_response(jsonify({'message': str(e)}), 400)
 
 
 @order_blueprint.route('/confirm_order/<int:order_id>', methods=['PUT'])
-@jwt_required()
+@role_required('user', message='You are not authorized to confirm orders')
 def confirm_order(order_id):
     try:
-        current_user = User.query.get(get_jwt_identity())
-        if current_user.role.role_name == "user":
-            order = Order.query.get(order_id)
-            if order:
-                if order.user_id != current_user.id:
-                    return make_response(jsonify({'message': 'You are not authorized to confirm this order'}), 403)
-                if order.confirmed:
-                    return make_response(jsonify({'message': 'Order already confirmed'}), 400)
-                else:
-                    order.confirm()
-                    return make_response(jsonify({'message': 'Order confirmed successfully'}), 200)
+        user_id = get_jwt_identity()
+        order = Order.query.get(order_id)
+        if order:
+            if order.user_id != user_id:
+                return make_response(jsonify({'message': 'You are not authorized to confirm this order'}), 403)
+            if order.confirmed:
+                return make_response(jsonify({'message': 'Order already confirmed'}), 400)
             else:
-                return make_response(jsonify({'message': 'Order not found'}), 404)
+                order.confirm()
+                invalidate('user:{}:orders'.format(user_id))
+                return make_response(jsonify({'message': 'Order confirmed successfully'}), 200)
         else:
-            return make_response(jsonify({'message': 'You are not authorized to confirm orders'}), 403)
+            return make_response(jsonify({'message': 'Order not found'}), 404)
     except Exception as e:
         logger.error(e)
         return make_response(jsonify({'message': str(e)}), 400)
 
 
 @order_blueprint.route('/confirm_all', methods=['PUT'])
-@jwt_required()
+@role_required('user', message='You are not authorized to confirm orders')
 def confirm_all():
     try:
-        current_user = User.query.get(get_jwt_identity())
-        if current_user.role.role_name == "user":
-            orders = Order.query.filter_by(user_id=current_user.id).filter_by(confirmed=False).all()
-            if orders:
-                for order in orders:
-                    order.confirm()
-                return make_response(jsonify({'message': 'Orders confirmed successfully'}), 200)
-            else:
-                return make_response(jsonify({'message': 'No orders found'}), 404)
+        user_id = get_jwt_identity()
+        if Order.confirm_all(user_id):
+            invalidate('user:{}:orders'.format(user_id))
+            return make_response(jsonify({'message': 'Orders confirmed successfully'}), 200)
         else:
-            return make_response(jsonify({'message': 'You are not authorized to confirm orders'}), 403)
+            return make_response(jsonify({'message': 'No orders found'}), 404)
     except Exception as e:
         logger.error(e)
         return make_response(jsonify({'message': str(e)}), 400)
 
 
 @order_blueprint.route('/update_order/<int:order_id>', methods=['PUT'])
-@jwt_required()
+@role_required('user', message='You are not authorized to update orders')
 def update_order(order_id):
     try:
-        current_user = User.query.get(get_jwt_identity())
-        if current_user.role.role_name == "user":
-            order = Order.query.get(order_id)
-            if order:
-                if order.confirmed:
-                    return make_response(jsonify({'message': 'Order already confirmed'}), 400)
-                else:
-                    body = request.get_json()
-                    new_quantity = body['quantity']
-                    order.update(new_quantity)
-                    return make_response(jsonify({'message': 'Order updated successfully'}), 200)
+        order = Order.query.get(order_id)
+        if order:
+            if order.confirmed:
+                return make_response(jsonify({'message': 'Order already confirmed'}), 400)
             else:
-                return make_response(jsonify({'message': 'Order not found'}), 404)
+                body = request.get_json()
+                new_quantity = body['quantity']
+                order.update(new_quantity)
+                invalidate('user:{}:orders'.format(get_jwt_identity()), *product_tags(order.product))
+                return make_response(jsonify({'message': 'Order updated successfully'}), 200)
         else:
-            return make_response(jsonify({'message': 'You are not authorized to update orders'}), 403)
+            return make_response(jsonify({'message': 'Order not found'}), 404)
     except Exception as e:
         logger.error(e)
         return make_response(jsonify({'message': str(e)}), 400)
@@ -2,23 +2,27 @@ from flask import jsonify, request, make_response
 from flask_jwt_extended import get_jwt_identity, jwt_required
 
 from database import db
-from database.models import Product, User
+from database.catalog import get_product_page, parse_product_filters
+from database.models import Product
 from database.schema import ProductSchema
+from database.serializers import product_serializer, json_response
 from error_log import logger
 from .managerAPI import manager_blueprint
 from .userAPI import user_blueprint
-from cache import cache
+from cache import cached, invalidate, product_tags
+from . import role_required, read_only
 
 
 @user_blueprint.route('/get_products', methods=['GET'])
-@cache.cached(timeout=60)
+@cached(timeout=60, tags=('catalog',), etag=True)
+@read_only
 def get_products():
-    product_schema = ProductSchema(many=True)
     try:
-        products = Product.query.all()
+        products, next_cursor = get_product_page(**parse_product_filters(request.args))
         if products:
-            return make_response(jsonify({'message': 'Products fetched successfully',
-                                          'products': product_schema.dump(products, many=True)}),
+            return json_response({'message': 'Products fetched successfully',
+                                  'products': product_serializer.dump(products, many=True),
+                                  'next_cursor': next_cursor},
                                  200)
         else:
             return make_response(jsonify({'message': 'No products found'}), 404)
@@ -28,18 +32,17 @@ def get_products():
 
 
 @manager_blueprint.route('/create_product', methods=['POST'])
-@jwt_required()
+@role_required('manager', message='You are not authorized to create products')
 def create_product():
     product_schema = ProductSchema(many=False)
     try:
         user_id = get_jwt_identity()
-        if User.query.get(user_id).role.role_name != 'manager':
-            return make_response(jsonify({'message': 'You are not authorized to create products'}), 403)
         body = request.get_json()
         body['added_by'] = user_id
         product = product_schema.load(body)
         db.session.add(product)
         db.session.commit()
+        invalidate(*product_tags(product))
         return make_response(jsonify({'message': 'Product created successfully',
                                       'product': product_schema.dump(product)}), 201)
     except Exception as e:
@@ -61,6 +64,7 @@ def update_stock(product_id):
                 if quantity < 0:
                     return make_response(jsonify({'message': 'Quantity cannot be negative'}), 400)
                 product.update_stock(quantity)
+                invalidate(*product_tags(product))
                 return make_response(jsonify({'message': 'Stock added successfully',
                                               'product': ProductSchema().dump(product)}), 200)
             else:
@@ -87,6 +91,7 @@ def update_rate(product_id):
                 if rate <= 0:
                     return make_response(jsonify({'message': 'Rate cannot be negative or zero'}), 400)
                 product.update_rate(rate)
+                invalidate(*product_tags(product))
                 return make_response(jsonify({'message': 'Price updated successfully',
                                               'product': ProductSchema().dump(product)}
                                              ), 200)
@@ -112,6 +117,7 @@ def update_expiry_date(product_id):
             expiry_date = body.get('expiry_date')
             if expiry_date:
                 product.update_expiry_date(expiry_date)
+                invalidate(*product_tags(product))
                 return make_response(jsonify({'message': 'Expiry date updated successfully',
                                               'product': ProductSchema().dump(product)}), 200)
             else:
@@ -134,6 +140,7 @@ def update_product(product_id):
                 return make_response(jsonify({'message': 'You are not authorized to update this product'}), 403)
             body = request.get_json()
             product = product.update_product(body['name'],body['description'])
+            invalidate(*product_tags(product))
             return make_response(jsonify({'message': 'Product updated successfully',
                                           'product': product_schema.dump(product)}), 200)
         else:
@@ -151,8 +158,10 @@ def delete_product(product_id):
         if product:
             if product.added_by != get_jwt_identity():
                 return make_response(jsonify({'message': 'You are not authorized to delete this product'}), 403)
+            tags = product_tags(product)
             db.session.delete(product)
             db.session.commit()
+            invalidate(*tags)
             return make_response(jsonify({'message': 'Product deleted successfully'}), 200)
         else:
             return make_response(jsonify({'message': 'Product not found'}), 404)
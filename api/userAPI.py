@@ -1,11 +1,13 @@
 from flask import jsonify, request, make_response, Blueprint
-from flask_jwt_extended import get_jwt_identity, jwt_required
+from flask_jwt_extended import get_jwt_identity
 
-from database import db
+from database import db, loaders
 from database.models import User, Order, Category, Role
-from database.schema import UserSchema, OrderSchema, CategorySchema
+from database.schema import UserSchema
+from database.serializers import category_serializer, order_serializer, json_response
 from error_log import logger
-from cache import cache
+from cache import cached
+from . import read_only
 
 user_blueprint = Blueprint('user', __name__)
 
@@ -27,16 +29,15 @@ def create_user():
 
 
 @user_blueprint.route('/', methods=['GET'])
-@cache.cached(timeout=60)
-@jwt_required()
+@cached(timeout=60, tags=('user:{identity}:orders',), per_identity=True)
 def get_user():
     user_schema = UserSchema()
     try:
         user_id = get_jwt_identity()
-        user = User.query.filter_by(id=user_id).first()
+        user = User.query.options(*loaders.USER).filter_by(id=user_id).first()
         user = user_schema.dump(user)
-        orders = Order.query.filter_by(user_id=user_id).all()
-        user['orders'] = OrderSchema(many=True).dump(orders)
+        orders = Order.query.options(*loaders.ORDER).filter_by(user_id=user_id).all()
+        user['orders'] = order_serializer.dump(orders, many=True)
         return make_response(jsonify(user), 200)
     except Exception as e:
         logger.error(e)
@@ -44,14 +45,14 @@ def get_user():
 
 
 @user_blueprint.route('/get_category/<int:category_id>', methods=['GET'])
-@cache.cached(timeout=60)
+@cached(timeout=60, tags=('category:{category_id}',), etag=True)
+@read_only
 def get_category(category_id):
-    category_schema = CategorySchema(many=False)
     try:
         category = Category.query.get(category_id)
         if category:
-            return make_response(jsonify({'message': 'Category fetched successfully',
-                                          'category': category_schema.dump(category)}),
+            return json_response({'message': 'Category fetched successfully',
+                                  'category': category_serializer.dump(category)},
                                  200)
         else:
             return make_response(jsonify({'message': 'Category not found'}), 404)
@@ -61,13 +62,13 @@ def get_category(category_id):
 
 
 @user_blueprint.route('/get_categories', methods=['GET'])
-@cache.cached(timeout=60)
+@cached(timeout=60, tags=('categories',), etag=True)
+@read_only
 def get_categories():
-    category_schema = CategorySchema(many=True)
     try:
         categories = Category.query.all()
-        return make_response(jsonify({'message': 'Categories fetched successfully',
-                                      'categories': category_schema.dump(categories)}),
+        return json_response({'message': 'Categories fetched successfully',
+                              'categories': category_serializer.dump(categories, many=True)},
                              200)
     except Exception as e:
         logger.error(e)
@@ -1,19 +1,23 @@
 from celery.schedules import crontab
 from api import init_api
-from config import Config
+from config import get_config
 from database import init_database
 from flask import Flask, jsonify
 from flask_cors import CORS, cross_origin
 from mail import init_mail
+from storage import init_storage
 from scheduled_jobs import celery, make_task
 from mail.reminder import send_reminder_mail, send_monthly_report
+from scheduled_jobs.maintenance import optimize_database
+from scheduled_jobs.images import process_pending_images
 
 app = Flask(__name__)
 CORS(app, supports_credentials=True, resources={r"/api/*": {"origins": "*"}})
-app.config.from_object(Config)
+app.config.from_object(get_config())
 init_api(app)
 init_database(app)
 init_mail(app)
+init_storage(app)
 app.extensions['celery'] = celery
 app.app_context().push()
 celery.Task = make_task(app)
@@ -42,6 +46,12 @@ def setup_periodic_tasks(sender, **kwargs):
                              send_monthly_report.s(),
                              name='send_monthly_report')
     # sender.add_periodic_task(60.0, send_monthly_report.s(), name='send_monthly_report')
+    sender.add_periodic_task(crontab(hour="3", minute="0"),
+                             optimize_database.s(),
+                             name='optimize_database')
+    sender.add_periodic_task(crontab(minute="*/10"),
+                             process_pending_images.s(),
+                             name='process_pending_images')
 
 
 @app.route('/routes', methods=['GET'])
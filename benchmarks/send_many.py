@@ -0,0 +1,88 @@
+"""
+Sending throughput of the reminder and report mails: one send_mail() call per mail, each over a connection of its own,
+as the jobs did before, against send_many() sending the whole batch over a single SMTP connection.
+
+    python -m benchmarks.send_many [--messages 300] [--port 8025] [--max-emails 100]
+
+Runs in a temporary directory, against a local debugging SMTP server that counts the connections it accepts and the
+messages it receives, and drops them. The server uses smtpd and asyncore, which were removed in Python 3.12.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+import warnings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKDIR = tempfile.mkdtemp(prefix='grocery-benchmark-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(WORKDIR, 'database.sqlite')
+sys.path.insert(0, ROOT)
+os.chdir(WORKDIR)
+
+with warnings.catch_warnings():
+    warnings.simplefilter('ignore', DeprecationWarning)
+    import asyncore
+    import smtpd
+
+from app import app  # noqa: E402
+from mail import mail, make_message, send_mail, send_many  # noqa: E402
+from mail.templates import render  # noqa: E402
+
+
+class CountingServer(smtpd.SMTPServer):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.connections = 0
+        self.messages = 0
+
+    def handle_accepted(self, conn, addr):
+        self.connections += 1
+        super().handle_accepted(conn, addr)
+
+    def process_message(self, *args, **kwargs):
+        self.messages += 1
+
+
+def mails(no_of_messages):
+    for i in range(no_of_messages):
+        yield dict(subject='Grocery app reminder', sender='reminder@grocery.com',
+                   recipients=['user{}@example.com'.format(i)],
+                   **render('reminder_pending_cart', username='user{}'.format(i), no_of_items=i % 5 + 1))
+
+
+def measure(server, send):
+    connections, messages = server.connections, server.messages
+    start = time.perf_counter()
+    send()
+    elapsed = time.perf_counter() - start
+    # the server counts a message once it has been received, shortly after the client has sent it
+    time.sleep(0.2)
+    return server.messages - messages, elapsed, server.connections - connections
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--messages', type=int, default=300)
+    parser.add_argument('--port', type=int, default=8025)
+    parser.add_argument('--max-emails', type=int, default=100)
+    args = parser.parse_args()
+    server = CountingServer(('127.0.0.1', args.port), None)
+    threading.Thread(target=asyncore.loop, kwargs={'timeout': 0.01}, daemon=True).start()
+    app.config.update(MAIL_SERVER='127.0.0.1', MAIL_PORT=args.port, MAIL_MAX_EMAILS=args.max_emails, TESTING=False,
+                      MAIL_SUPPRESS_SEND=False)
+    mail.init_app(app)
+    cases = [
+        ('send_mail', lambda: [send_mail(**message) for message in mails(args.messages)]),
+        ('send_many', lambda: send_many(make_message(**message) for message in mails(args.messages))),
+    ]
+    print('{:<12}{:>10}{:>12}{:>14}'.format('', 'received', 'messages/s', 'connections'))
+    for name, send in cases:
+        received, elapsed, connections = measure(server, send)
+        print('{:<12}{:>10}{:>12.0f}{:>14}'.format(name, received, args.messages / elapsed, connections))
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        main()
@@ -0,0 +1,78 @@
+"""
+Dump throughput of the list endpoints: marshmallow's schema.dump() encoded with jsonify, as the views did before,
+against the compiled serializers of database/serializers.py encoded with orjson.
+
+    python -m benchmarks.serializers [--products 500] [--orders 200] [--rounds 20]
+
+Runs in a temporary directory, against a SQLite database filled with products spread over a few categories and
+images, and orders of the first of them.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKDIR = tempfile.mkdtemp(prefix='grocery-benchmark-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(WORKDIR, 'database.sqlite')
+sys.path.insert(0, ROOT)
+os.chdir(WORKDIR)
+
+from flask import jsonify  # noqa: E402
+
+from app import app  # noqa: E402
+from database import db, loaders  # noqa: E402
+from database.models import Category, Order, Product, ProductImage, Role, User  # noqa: E402
+from database.schema import CategorySchema, OrderSchema, ProductSchema  # noqa: E402
+from database.serializers import category_serializer, json_response, order_serializer, product_serializer  # noqa: E402
+
+
+def populate(no_of_products, no_of_orders):
+    manager = User('benchmanager', 'Password123', 'manager@example.com',
+                   Role.query.filter_by(role_name='manager').first().id)
+    user = User('benchuser', 'Password123', 'user@example.com', Role.query.filter_by(role_name='user').first().id)
+    images = [ProductImage('image{}.png'.format(i)) for i in range(5)]
+    categories = [Category('category{}'.format(i), 'a category of products') for i in range(5)]
+    db.session.add_all([manager, user] + images + categories)
+    db.session.commit()
+    products = [Product('product{:04d}'.format(i), 1.5 + i, 'kg', 'a product of the benchmark', manager.id,
+                        categories[i % 5].id, current_stock=no_of_orders + 1, image_id=images[i % 5].id)
+                for i in range(no_of_products)]
+    db.session.add_all(products)
+    db.session.commit()
+    for product in products[:no_of_orders]:
+        Order(product.id, user.id, 1)
+
+
+def rows_per_second(encode, rows, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        encode()
+    return rounds * len(rows) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--products', type=int, default=500)
+    parser.add_argument('--orders', type=int, default=200)
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+    populate(args.products, args.orders)
+    cases = [
+        ('products', ProductSchema(), product_serializer, Product.query.options(*loaders.PRODUCT).all()),
+        ('orders', OrderSchema(), order_serializer, Order.query.options(*loaders.ORDER).all()),
+        ('categories', CategorySchema(), category_serializer, Category.query.all()),
+    ]
+    print('{:<12}{:>24}{:>24}{:>10}'.format('rows/s', 'marshmallow + jsonify', 'compiled + orjson', 'speedup'))
+    for name, schema, serializer, rows in cases:
+        before = rows_per_second(lambda: jsonify({'rows': schema.dump(rows, many=True)}).get_data(), rows,
+                                 args.rounds)
+        after = rows_per_second(lambda: json_response({'rows': serializer.dump(rows, many=True)}).get_data(), rows,
+                                args.rounds)
+        print('{:<12}{:>24.0f}{:>24.0f}{:>9.1f}x'.format(name, before, after, after / before))
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        main()
@@ -1,5 +1,14 @@
+import functools
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from flask import make_response
 from flask_caching import Cache, request
+from flask_jwt_extended import get_jwt, get_jwt_identity, jwt_required
 from app import app
+from database.routing import has_replica
+from error_log import logger
 
 config = {
     "CACHE_TYPE": "RedisCache",
@@ -13,9 +22,120 @@ config = {
 cache = Cache(app, config=config)
 
 
-@app.before_request
-def after_request():
-    if request.method in ["POST", "PUT", "DELETE"]:
-        with app.app_context():
-            cache.clear()
-            print('cache cleared')
+def tag_key(tag):
+    return 'tag:{}'.format(tag)
+
+
+def seed_version():
+    # Counters start at the current time in milliseconds, so a counter recreated after the cache has been flushed
+    # starts above every value it had before and versions (and the ETags derived from them) never repeat.
+    return int(time.time() * 1000)
+
+
+def written_key(tag):
+    return 'written:{}'.format(tag)
+
+
+def tag_state(tags):
+    """
+    Returns the current version of every tag, and whether any of them was invalidated within the last
+    READ_YOUR_WRITES_WINDOW seconds, in a single round trip to the cache once the tags exist.
+    """
+    if not tags:
+        return [], False
+    keys = [tag_key(tag) for tag in tags]
+    markers = [written_key(tag) for tag in tags] if has_replica() else []
+    values = cache.get_many(*keys, *markers)
+    versions = values[:len(keys)]
+    for i, version in enumerate(versions):
+        if version is None:
+            cache.cache.add(keys[i], seed_version(), timeout=0)
+            versions[i] = cache.get(keys[i])
+    return versions, any(marker is not None for marker in values[len(keys):])
+
+
+def invalidate(*tags):
+    """
+    Invalidates every cached entry tagged with any of the given tags.
+
+    Entries are never deleted, bumping the version of a tag changes the cache key of every entry tagged with it,
+    and the stale entries simply expire. With a read replica, the tags are also marked as written for
+    READ_YOUR_WRITES_WINDOW seconds first, so the views rendering them read from the primary until the replica has
+    caught up, see api.read_only. A cache failure is logged and ignored, the write it follows has already been
+    committed.
+    """
+    try:
+        tags = set(tags)
+        if has_replica():
+            cache.set_many({written_key(tag): 1 for tag in tags}, timeout=app.config['READ_YOUR_WRITES_WINDOW'])
+        for tag in tags:
+            cache.cache.add(tag_key(tag), seed_version(), timeout=0)
+            cache.cache.inc(tag_key(tag))
+    except Exception as e:
+        logger.error(e)
+
+
+def product_tags(*products):
+    # category views hold no product data, so stock changes, the most frequent writes, leave them cached
+    return ['catalog'] + ['product:{}'.format(product.id) for product in products]
+
+
+def category_tags(*category_ids):
+    # products are listed with their category
+    return ['catalog', 'categories'] + ['category:{}'.format(category_id) for category_id in category_ids]
+
+
+def cached(timeout=60, tags=(), per_identity=False, etag=False):
+    """
+    Caches the response of a view like :meth:`Cache.cached`, keyed on the path, the query string and the
+    versions of the given tags. Tags may contain placeholders for the view arguments, e.g. 'category:{category_id}'.
+
+    With per_identity=True the view is protected by :func:`jwt_required`, the JWT is verified before the cache is
+    looked up and the identity and role of the caller are part of the key, so a response is only ever served back
+    to the user it was rendered for. Tags may then also use the {identity} placeholder.
+
+    With etag=True every response carries a strong ETag derived from the cache key, and a request whose
+    If-None-Match matches it is answered with 304 Not Modified before the view or the cached response is touched.
+    """
+
+    def make_cache_key(*args, **kwargs):
+        key = getattr(request, 'view_cache_key', None)
+        if key is None:
+            identity = role = None
+            if per_identity:
+                identity = get_jwt_identity()
+                role = get_jwt().get('role')
+            versions, request.tags_recently_written = tag_state([tag.format(identity=identity, **kwargs)
+                                                                 for tag in tags])
+            query = urlencode(sorted(request.args.items(multi=True)))
+            key = 'view/{}/{}{}?{}#{}'.format(identity, role, request.path, query,
+                                             '.'.join(str(version) for version in versions))
+            request.view_cache_key = key
+        return key
+
+    def conditional(view):
+        @functools.wraps(view)
+        def decorated_function(*args, **kwargs):
+            try:
+                value = hashlib.sha1(make_cache_key(*args, **kwargs).encode()).hexdigest()
+            except Exception as e:
+                logger.error(e)
+                return view(*args, **kwargs)
+            if request.if_none_match.contains(value):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+            response.set_etag(value)
+            return response
+
+        return decorated_function
+
+    def decorator(f):
+        view = cache.cached(timeout=timeout, make_cache_key=make_cache_key)(f)
+        if etag:
+            view = conditional(view)
+        if per_identity:
+            view = jwt_required()(view)
+        return view
+
+    return decorator
@@ -4,8 +4,44 @@ from datetime import timedelta
 
 class Config(object):
     # database config
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(os.path.dirname(os.path.abspath(__file__)), 'database.sqlite')
+    SQLALCHEMY_DATABASE_URI = os.environ.get(
+        'DATABASE_URL',
+        'sqlite:///' + os.path.join(os.path.dirname(os.path.abspath(__file__)), 'database.sqlite'))
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # engine config, see database/engine.py
+    # applied to every new SQLite connection
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',  # readers no longer block the writer and vice versa
+        'synchronous': 'NORMAL',  # safe in WAL mode, fsyncs on checkpoints instead of every commit
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000)),  # ms to wait for a lock instead of failing
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,  # in KiB when negative
+    }
+    # read-only views read from the replica when DATABASE_REPLICA_URL is set, see database/routing.py,
+    # except for callers who wrote within the last READ_YOUR_WRITES_WINDOW seconds
+    SQLALCHEMY_BINDS = {'replica': os.environ['DATABASE_REPLICA_URL']} if 'DATABASE_REPLICA_URL' in os.environ else {}
+    READ_YOUR_WRITES_WINDOW = int(os.environ.get('READ_YOUR_WRITES_WINDOW', 5))
+    # requests larger than this are refused with 413 while they are being received, instead of being buffered first;
+    # image uploads are the largest requests, see ProductImageSchema.MAX_BYTES
+    MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 3 * 1024 * 1024))
+    # where images and exports are stored, see storage/backends.py: 'local' under STORAGE_ROOT, or 's3' in S3_BUCKET
+    # of S3 or of the S3-compatible server at S3_ENDPOINT_URL, public files being downloaded from S3_PUBLIC_URL
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'local')
+    STORAGE_ROOT = os.environ.get('STORAGE_ROOT', 'static')
+    S3_BUCKET = os.environ.get('S3_BUCKET')
+    S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL')
+    S3_PUBLIC_URL = os.environ.get('S3_PUBLIC_URL')
+    # files are sent by the web server in front of the app when one of these is set, see storage/delivery.py
+    X_ACCEL_REDIRECT_PREFIX = os.environ.get('X_ACCEL_REDIRECT_PREFIX')
+    USE_X_SENDFILE = os.environ.get('USE_X_SENDFILE', '').lower() in ('1', 'true', 'yes')
+    # resized images made by /api/image/<id>/resize, the least recently used are evicted above IMAGE_VARIANT_CACHE_BYTES
+    IMAGE_VARIANT_DIR = os.environ.get('IMAGE_VARIANT_DIR', os.path.join('instance', 'variants'))
+    IMAGE_VARIANT_CACHE_BYTES = int(os.environ.get('IMAGE_VARIANT_CACHE_BYTES', 512 * 1024 * 1024))
+    # used for server databases (PostgreSQL, MySQL, ...) only
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    DB_POOL_PRE_PING = True
     # jwt config
     JWT_SECRET_KEY = 'super-secret'
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(days=1)
@@ -20,3 +56,36 @@ class Config(object):
     MAIL_PORT = 1025
     MAIL_USE_TLS = False
     MAIL_USE_SSL = False
+    # transactional mails are retried MAIL_MAX_RETRIES times, waiting MAIL_RETRY_BACKOFF seconds doubled on every
+    # retry, before being recorded as failed
+    MAIL_MAX_RETRIES = int(os.environ.get('MAIL_MAX_RETRIES', 5))
+    MAIL_RETRY_BACKOFF = int(os.environ.get('MAIL_RETRY_BACKOFF', 10))
+    MAIL_RETRY_BACKOFF_MAX = int(os.environ.get('MAIL_RETRY_BACKOFF_MAX', 600))
+    # messages sent by mail.send_many over one SMTP connection before it is reopened
+    MAIL_MAX_EMAILS = int(os.environ.get('MAIL_MAX_EMAILS', 100))
+    # reminder and report mails are sent in chunks of MAIL_CHUNK_SIZE recipients, by parallel tasks started at most
+    # MAIL_CHUNK_RATE_LIMIT times per worker
+    MAIL_CHUNK_SIZE = int(os.environ.get('MAIL_CHUNK_SIZE', 500))
+    MAIL_CHUNK_RATE_LIMIT = os.environ.get('MAIL_CHUNK_RATE_LIMIT', '10/m')
+
+
+class DevelopmentConfig(Config):
+    pass
+
+
+class ProductionConfig(Config):
+    JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY', Config.JWT_SECRET_KEY)
+    JWT_COOKIE_SECURE = True
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+
+
+profiles = {
+    'development': DevelopmentConfig,
+    'production': ProductionConfig,
+}
+
+
+def get_config():
+    # the profile is selected with the APP_CONFIG environment variable, development by default
+    return profiles[os.environ.get('APP_CONFIG', 'development')]
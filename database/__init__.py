@@ -1,14 +1,24 @@
 from flask_sqlalchemy import SQLAlchemy
 
-db = SQLAlchemy()
+from .routing import RoutingSession
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 
 def init_database(app):
     from .models import User, Product, Category, Order, Role, ProductImage
+    from .migrations import migrate
+    from .engine import engine_options, is_sqlite, apply_sqlite_pragmas
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {**engine_options(app.config),
+                                               **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})}
     db.init_app(app)
     with app.app_context():
+        for engine in db.engines.values():
+            if is_sqlite(engine.url):
+                apply_sqlite_pragmas(engine, app.config['SQLITE_PRAGMAS'])
         db.create_all()
         db.session.commit()
+        migrate(db.engine)
         print("Database initialized")
 
         if not Role.query.filter_by(role_name='admin').first():
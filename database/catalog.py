@@ -0,0 +1,136 @@
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import and_, or_, tuple_
+from .loaders import PRODUCT
+from .models import Product
+
+SORT_KEYS = {
+    'id': Product.id,
+    'name': Product.name,
+    'rate': Product.rate,
+    'expiry_date': Product.expiry_date,
+}
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 100
+
+
+def parse_date(value, field):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError("{} must be a date in the format YYYY-MM-DD".format(field))
+
+
+def encode_cursor(sort, product):
+    value = getattr(product, sort)
+    if sort == 'expiry_date' and value is not None:
+        value = value.strftime('%Y-%m-%d')
+    raw = json.dumps([value, product.id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(sort, cursor):
+    try:
+        value, product_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if sort == 'expiry_date' and value is not None:
+            value = parse_date(value, 'cursor')
+        return value, int(product_id)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+
+def after_cursor(column, value, last_id, order):
+    """
+    Returns the condition selecting the products after the one whose sort key is value and id is last_id.
+    Products without a sort key come first in ascending order and last in descending order, as SQLite sorts NULLs,
+    and are compared explicitly, as (rate, id) > (NULL, id) is NULL and would end the pagination.
+    """
+    if column is None:
+        return Product.id > last_id if order == 'asc' else Product.id < last_id
+    if order == 'asc':
+        if value is None:
+            return or_(and_(column.is_(None), Product.id > last_id), column.isnot(None))
+        return tuple_(column, Product.id) > tuple_(value, last_id)
+    if value is None:
+        return and_(column.is_(None), Product.id < last_id)
+    return or_(tuple_(column, Product.id) < tuple_(value, last_id), column.is_(None))
+
+
+def parse_product_filters(args):
+    """
+    Builds the keyword arguments of :func:`get_product_page` from the query string of a request.
+    Raises ValueError with a message suitable for the client if any of the arguments is malformed.
+    """
+    filters = {}
+    try:
+        if 'limit' in args:
+            filters['limit'] = int(args['limit'])
+        if 'category_id' in args:
+            filters['category_id'] = int(args['category_id'])
+        if 'min_rate' in args:
+            filters['min_rate'] = float(args['min_rate'])
+        if 'max_rate' in args:
+            filters['max_rate'] = float(args['max_rate'])
+    except ValueError:
+        raise ValueError("limit and category_id must be integers, min_rate and max_rate must be numbers")
+    if 'expires_after' in args:
+        filters['expires_after'] = parse_date(args['expires_after'], 'expires_after')
+    if 'expires_before' in args:
+        filters['expires_before'] = parse_date(args['expires_before'], 'expires_before')
+    filters['in_stock'] = args.get('in_stock', 'false').lower() in ('1', 'true', 'yes')
+    filters['sort'] = args.get('sort', 'id')
+    filters['order'] = args.get('order', 'asc')
+    filters['cursor'] = args.get('cursor')
+    return filters
+
+
+def get_product_page(limit=DEFAULT_LIMIT, cursor=None, sort='id', order='asc', category_id=None,
+                     min_rate=None, max_rate=None, in_stock=False, expires_after=None, expires_before=None):
+    """
+    Returns one page of the product catalog and the cursor of the next page.
+
+    Pages are fetched with keyset pagination on (sort key, id), so every page is a bounded index range
+    scan no matter how deep into the catalog the client is. The cursor is opaque to the client,
+    it encodes the sort key and id of the last product of the previous page.
+
+    :return: (products, next_cursor), next_cursor is None on the last page.
+    """
+    if sort not in SORT_KEYS:
+        raise ValueError("sort must be one of {}".format(list(SORT_KEYS)))
+    if order not in ('asc', 'desc'):
+        raise ValueError("order must be one of ['asc', 'desc']")
+    if not 0 < limit <= MAX_LIMIT:
+        raise ValueError("limit must be between 1 and {}".format(MAX_LIMIT))
+
+    column = SORT_KEYS[sort]
+    query = Product.query.options(*PRODUCT)
+    if category_id is not None:
+        query = query.filter(Product.category_id == category_id)
+    if min_rate is not None:
+        query = query.filter(Product.rate >= min_rate)
+    if max_rate is not None:
+        query = query.filter(Product.rate <= max_rate)
+    if in_stock:
+        query = query.filter(Product.current_stock > 0)
+    if expires_after is not None:
+        query = query.filter(Product.expiry_date >= expires_after)
+    if expires_before is not None:
+        query = query.filter(Product.expiry_date <= expires_before)
+
+    sort_column = None if sort == 'id' else column
+    if cursor:
+        value, last_id = decode_cursor(sort, cursor)
+        query = query.filter(after_cursor(sort_column, value, last_id, order))
+    if order == 'asc':
+        keys = (Product.id,) if sort_column is None else (sort_column.asc().nulls_first(), Product.id)
+    else:
+        keys = (Product.id.desc(),) if sort_column is None else (sort_column.desc().nulls_last(), Product.id.desc())
+    query = query.order_by(*keys)
+
+    products = query.limit(limit + 1).all()
+    if len(products) > limit:
+        products = products[:limit]
+        return products, encode_cursor(sort, products[-1])
+    return products, None
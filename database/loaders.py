@@ -0,0 +1,17 @@
+"""
+Loader profiles, eager loading exactly the relationships each schema dumps, e.g. Product.query.options(*PRODUCT).
+CategorySchema needs none: Category.products is a dynamic relationship, which the schema does not load when dumping.
+"""
+from sqlalchemy.orm import joinedload
+
+from .models import User, Product, Order
+
+# UserSchema: role
+USER = (joinedload(User.role),)
+
+# ProductSchema: category, image
+PRODUCT = (joinedload(Product.category), joinedload(Product.image))
+
+# OrderSchema: product, and through ProductSchema its category and image
+ORDER = (joinedload(Order.product).joinedload(Product.category),
+         joinedload(Order.product).joinedload(Product.image))
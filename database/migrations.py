@@ -0,0 +1,77 @@
+"""
+Versioned schema migrations, for databases created before a change to the models.
+
+db.create_all() creates missing tables with all their columns and indexes, but never alters an existing table.
+Every change to an existing table is therefore also added here as a migration, with the next version number.
+Applied versions are recorded in the schema_version table and every pending migration runs once, in its own
+transaction, when the database is initialized. Migrations must be idempotent, since on a new database
+db.create_all() has already done their work.
+"""
+from datetime import datetime
+
+from sqlalchemy import inspect
+from sqlalchemy.schema import CreateColumn
+
+from . import db
+from .models import Product, Order, CategoryRequest, ManagerCreationRequests, ProductImage
+
+schema_version = db.Table(
+    'schema_version',
+    db.Column('version', db.Integer, primary_key=True),
+    db.Column('description', db.String(256)),
+    db.Column('applied_on', db.DateTime),
+)
+
+
+def create_indexes(*tables):
+    def migration(connection):
+        for table in tables:
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+
+    return migration
+
+
+def add_columns(table, *names):
+    def migration(connection):
+        existing = {column['name'] for column in inspect(connection).get_columns(table.name)}
+        for name in names:
+            if name not in existing:
+                column = CreateColumn(table.columns[name]).compile(dialect=connection.dialect)
+                connection.exec_driver_sql('ALTER TABLE {} ADD COLUMN {}'.format(table.name, column))
+
+    return migration
+
+
+MIGRATIONS = [
+    (1, 'Add indexes on orders, products and pending requests',
+     create_indexes(Order.__table__, Product.__table__, CategoryRequest.__table__,
+                    ManagerCreationRequests.__table__)),
+    (2, 'Add original name, status, renditions and upload time to product images',
+     add_columns(ProductImage.__table__, 'original_name', 'status', 'renditions', 'uploaded_on')),
+    (3, 'Add a unique index on the original name of product images, the hash of the upload',
+     create_indexes(ProductImage.__table__)),
+]
+
+
+def current_version(connection):
+    return connection.execute(db.select(db.func.max(schema_version.c.version))).scalar() or 0
+
+
+def migrate(engine):
+    """
+    Applies every pending migration and returns the version of the schema.
+    """
+    schema_version.create(engine, checkfirst=True)
+    with engine.connect() as connection:
+        version = current_version(connection)
+    for number, description, migration in MIGRATIONS:
+        if number <= version:
+            continue
+        with engine.begin() as connection:
+            migration(connection)
+            connection.execute(schema_version.insert().values(version=number, description=description,
+                                                              applied_on=datetime.now()))
+        print("Migration {} applied: {}".format(number, description))
+        version = number
+    return version
@@ -1,3 +1,4 @@
+from collections import defaultdict
 from datetime import datetime, timedelta
 
 from sqlalchemy.exc import NoResultFound
@@ -102,9 +103,18 @@ class Product(db.Model):
         - add_stock(quantity): Adds stock to the product.
         - update_price(new_price): Updates the price of the product.
         - update_expiry_date(new_expiry_date): Updates the expiry date of the product.
+        - reserve_stock(product_id, quantity): Takes quantity out of the stock of a product, if there is enough.
+        - release_stock(product_id, quantity): Puts quantity back into the stock of a product.
 
     """
     __tablename__ = 'product'
+    __table_args__ = (
+        db.Index('ix_product_category_id', 'category_id'),
+        db.Index('ix_product_added_by', 'added_by'),
+        # keyset pagination of the catalog on (sort key, id)
+        db.Index('ix_product_rate_id', 'rate', 'id'),
+        db.Index('ix_product_expiry_date_id', 'expiry_date', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), unique=True)
     rate = db.Column(db.Float)
@@ -162,6 +172,24 @@ class Product(db.Model):
         db.session.commit()
         return self
 
+    @staticmethod
+    def reserve_stock(product_id, quantity):
+        # A single conditional UPDATE, so concurrent orders can never both take the last units of a product.
+        # It is not committed, the caller commits it together with whatever the stock was reserved for.
+        result = db.session.execute(
+            db.update(Product)
+            .where(Product.id == product_id, Product.current_stock >= quantity)
+            .values(current_stock=Product.current_stock - quantity))
+        if result.rowcount != 1:
+            raise ValueError("Not enough stock available")
+
+    @staticmethod
+    def release_stock(product_id, quantity):
+        db.session.execute(
+            db.update(Product)
+            .where(Product.id == product_id)
+            .values(current_stock=Product.current_stock + quantity))
+
 
 class Category(db.Model):
     """
@@ -236,10 +264,18 @@ class Order(db.Model):
         - confirm(): Confirms the order and returns the Order object.
         - update(quantity): Updates the quantity of the order and returns the Order object.
         - delete(): Deletes the order and returns None.
+        - place_many(user_id, items): Places several orders in a single transaction and returns their IDs.
+        - confirm_all(user_id): Confirms every unconfirmed order of a user and returns how many were confirmed.
+        - cancel_all(user_id): Cancels every unconfirmed order of a user and returns the products restocked.
         - get_all_orders(): Returns a list of all orders.
 
     """
     __tablename__ = 'order'
+    __table_args__ = (
+        db.Index('ix_order_user_id_confirmed', 'user_id', 'confirmed'),
+        db.Index('ix_order_order_time', 'order_time'),
+        db.Index('ix_order_product_id', 'product_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     order_time = db.Column(db.DateTime, default=datetime.now(), onupdate=datetime.now())
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'))
@@ -250,22 +286,20 @@ class Order(db.Model):
     product = db.relationship('Product', backref='orders')
 
     def __init__(self, product_id, user_id, quantity):
-        try:
-            product = Product.query.filter_by(id=product_id).first()
-            user = User.query.filter_by(id=user_id).first()
-            if product.current_stock < quantity:
-                raise ValueError("Not enough stock available")
-            else:
-                product.current_stock -= quantity
-                db.session.add(product)
-                self.product_id = product_id
-                self.user_id = user_id
-                self.quantity = quantity
-                self.value = product.rate * quantity
-                db.session.add(self)
-                db.session.commit()
-        except NoResultFound:
+        product = Product.query.filter_by(id=product_id).first()
+        if product is None:
             raise NoResultFound("Product does not exist")
+        try:
+            Product.reserve_stock(product_id, quantity)
+            self.product_id = product_id
+            self.user_id = user_id
+            self.quantity = quantity
+            self.value = product.rate * quantity
+            db.session.add(self)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
 
     def __repr__(self):
         return '<order {}>'.format(self.id)
@@ -278,24 +312,99 @@ class Order(db.Model):
 
     def update(self,quantity):
         product = Product.query.get(self.product_id)
-        if product.current_stock + self.quantity >= quantity:
-            product.current_stock += self.quantity - quantity
-            db.session.add(product)
+        try:
+            if quantity > self.quantity:
+                Product.reserve_stock(self.product_id, quantity - self.quantity)
+            else:
+                Product.release_stock(self.product_id, self.quantity - quantity)
             self.quantity = quantity
-            self.value = product.product_rate * quantity
+            self.value = product.rate * quantity
             db.session.add(self)
             db.session.commit()
-        else:
-            raise ValueError("Not enough stock available")
+        except Exception:
+            db.session.rollback()
+            raise
 
     def delete(self):
-        product = Product.query.get(self.product_id)
-        product.current_stock += self.quantity
-        db.session.add(product)
+        Product.release_stock(self.product_id, self.quantity)
         db.session.delete(self)
         db.session.commit()
         return None
 
+    @staticmethod
+    def place_many(user_id, items):
+        """
+        Places one order per item of a cart, all or nothing: if any product does not exist or does not have enough
+        stock, no order is placed and no stock is reserved.
+
+        :param items: list of dicts with product_id and quantity.
+        :return: the IDs of the placed orders.
+        """
+        product_ids = {item['product_id'] for item in items}
+        products = {product.id: product for product in Product.query.filter(Product.id.in_(product_ids))}
+        for product_id in product_ids:
+            if product_id not in products:
+                raise NoResultFound("Product with id {} does not exist".format(product_id))
+        quantities = defaultdict(int)
+        for item in items:
+            quantities[item['product_id']] += item['quantity']
+        try:
+            # one reservation per product, always in the same order, so two carts holding the same products can not
+            # deadlock on the row locks of a server database
+            for product_id in sorted(quantities):
+                Product.reserve_stock(product_id, quantities[product_id])
+            order_ids = db.session.scalars(
+                db.insert(Order).returning(Order.id),
+                [{'product_id': item['product_id'], 'user_id': user_id, 'quantity': item['quantity'],
+                  'value': products[item['product_id']].rate * item['quantity']} for item in items]).all()
+            db.session.commit()
+            return order_ids
+        except Exception:
+            db.session.rollback()
+            raise
+
+    @staticmethod
+    def confirm_all(user_id):
+        result = db.session.execute(
+            db.update(Order)
+            .where(Order.user_id == user_id, Order.confirmed == False)
+            .values(confirmed=True)
+            .execution_options(synchronize_session=False))
+        db.session.commit()
+        return result.rowcount
+
+    @staticmethod
+    def cancel_all(user_id):
+        """
+        Cancels every unconfirmed order of a user with one DELETE returning the deleted orders and one grouped UPDATE
+        putting their quantities back into stock, in a single transaction however many orders there are. Only the
+        orders actually deleted are restocked, so an order confirmed concurrently keeps both its order and its stock.
+
+        :return: (id, category_id) of every product restocked, empty if the user had no unconfirmed order.
+        """
+        try:
+            deleted = db.session.execute(
+                db.delete(Order)
+                .where(Order.user_id == user_id, Order.confirmed == False)
+                .returning(Order.product_id, Order.quantity)
+                .execution_options(synchronize_session=False)).all()
+            quantities = defaultdict(int)
+            for product_id, quantity in deleted:
+                quantities[product_id] += quantity
+            products = []
+            if quantities:
+                products = db.session.execute(
+                    db.update(Product)
+                    .where(Product.id.in_(quantities))
+                    .values(current_stock=Product.current_stock + db.case(quantities, value=Product.id))
+                    .returning(Product.id, Product.category_id)
+                    .execution_options(synchronize_session=False)).all()
+            db.session.commit()
+            return products
+        except Exception:
+            db.session.rollback()
+            raise
+
     @staticmethod
     def get_all_orders():
         return Order.query.all()
@@ -330,6 +439,9 @@ class CategoryRequest(db.Model):
 
     """
     __tablename__ = 'category_request'
+    __table_args__ = (
+        db.Index('ix_category_request_approved', 'approved'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     category_id = db.Column(db.Integer, nullable=True)
     category_name = db.Column(db.String(100), nullable=True)
@@ -407,6 +519,9 @@ class CategoryRequest(db.Model):
 
 class ManagerCreationRequests(db.Model):
     __tablename__ = 'manager_creation_requests'
+    __table_args__ = (
+        db.Index('ix_manager_creation_requests_approved', 'approved'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(100), unique=True)
     password = db.Column(db.String(256))
@@ -441,25 +556,111 @@ class ProductImage(db.Model):
     """
     :class:`ProductImage` class represents a product image in the system.
     Each image can be assigned to more than one product.
-    All images are saved in the ./static/images directory, so name is enough to identify the image.
+    All images are stored in the images folder of the storage backend, so name is enough to identify the image.
+    Uploads are saved as they are and processed in the background into renditions of several sizes and formats,
+    see scheduled_jobs/images.py; until then image_name is the uploaded file. Files are named after the hash of their
+    bytes (see storage), an upload identical to an earlier one reuses its ProductImage.
 
     Attributes:
     ----------
         - id (int): The ID of the product image (primary key).
         - image_name (str): The name of the image.
+        - original_name (str): The name of the uploaded file, None for images uploaded before renditions existed.
+        - status (str): 'pending' until the renditions are made, then 'ready', or 'failed'.
+        - renditions (dict): The name of every rendition by size and format, e.g. renditions['thumbnail']['webp'].
+        - uploaded_on (datetime): The date and time when the image was uploaded.
 
     Methods:
     -------
-        - __init__(image_name): Initializes a new instance of the ProductImage class.
+        - __init__(image_name, original_name=None, status='ready'): Initializes a new instance of the ProductImage class.
         - __repr__(): Returns a string representation of the ProductImage object.
+        - file_names(): Returns the names of all files of the image.
+        - shared_file_names(): Returns the names of the files of the image also used by other images.
     """
 
     __tablename__ = 'product_image'
+    __table_args__ = (
+        db.Index('ix_product_image_original_name', 'original_name', unique=True),
+    )
     id = db.Column(db.Integer, primary_key=True)
     image_name = db.Column(db.String(256))
+    original_name = db.Column(db.String(256), nullable=True)
+    status = db.Column(db.String(10), default='ready', server_default='ready')
+    renditions = db.Column(db.JSON, nullable=True)
+    uploaded_on = db.Column(db.DateTime, default=datetime.now)
 
-    def __init__(self, image_name):
+    def __init__(self, image_name, original_name=None, status='ready'):
         self.image_name = image_name
+        self.original_name = original_name
+        self.status = status
 
     def __repr__(self):
         return '<product_image {}>'.format(self.image_name)
+
+    def file_names(self):
+        names = {self.image_name}
+        if self.original_name:
+            names.add(self.original_name)
+        for formats in (self.renditions or {}).values():
+            names.update(formats.values())
+        return names
+
+    def shared_file_names(self):
+        # different uploads may still have identical renditions, which are then stored once
+        names = self.file_names()
+        others = ProductImage.query.filter(ProductImage.id != self.id, db.or_(
+            ProductImage.image_name.in_(names),
+            ProductImage.original_name.in_(names),
+            *[db.cast(ProductImage.renditions, db.Text).contains(name) for name in names])).all()
+        shared = set()
+        for other in others:
+            shared.update(names & other.file_names())
+        return shared
+
+
+class FailedMail(db.Model):
+    """
+    :class:`FailedMail` class represents a transactional mail that could not be sent, after all its retries.
+    Kept so that the mail can be inspected and sent again by hand.
+
+    Attributes:
+    ----------
+        - id (int): The ID of the failed mail (primary key).
+        - subject (str): The subject of the mail.
+        - sender (str): The sender of the mail.
+        - recipients (str): The recipients of the mail, comma separated.
+        - text_body (str): The plain text part of the mail.
+        - html_body (str): The HTML part of the mail.
+        - error (str): The last error raised while sending the mail.
+        - attempts (int): How many times sending the mail was attempted.
+        - failed_at (datetime): The date and time of the last attempt.
+
+    Methods:
+    -------
+        - __init__(subject, sender, recipients, text_body, html_body, error, attempts): Initializes a new instance of
+          the FailedMail class.
+        - __repr__(): Returns a string representation of the FailedMail object.
+    """
+
+    __tablename__ = 'failed_mail'
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.String(256))
+    sender = db.Column(db.String(100))
+    recipients = db.Column(db.Text)
+    text_body = db.Column(db.Text, nullable=True)
+    html_body = db.Column(db.Text, nullable=True)
+    error = db.Column(db.Text)
+    attempts = db.Column(db.Integer)
+    failed_at = db.Column(db.DateTime, default=datetime.now)
+
+    def __init__(self, subject, sender, recipients, text_body, html_body, error, attempts):
+        self.subject = subject
+        self.sender = sender
+        self.recipients = ','.join(recipients)
+        self.text_body = text_body
+        self.html_body = html_body
+        self.error = error
+        self.attempts = attempts
+
+    def __repr__(self):
+        return '<failed_mail {}>'.format(self.id)
@@ -0,0 +1,28 @@
+"""
+Read/write routing: queries of read-only views go to the replica bind, when one is configured, everything else to the
+primary engine. Views opt in with api.read_only, which also keeps callers on the primary right after they wrote.
+"""
+from flask import current_app, has_request_context, request
+from flask_sqlalchemy.session import Session
+
+REPLICA = 'replica'
+
+
+def has_replica():
+    return REPLICA in current_app.config.get('SQLALCHEMY_BINDS', {})
+
+
+def reads_from_replica():
+    return has_request_context() and getattr(request, 'read_only', False)
+
+
+class RoutingSession(Session):
+    """
+    :class:`RoutingSession` is the session of db, routing the statements of read-only requests to the replica.
+    Flushes always go to the primary, even in a read-only request.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and reads_from_replica() and REPLICA in self._db.engines:
+            return self._db.engines[REPLICA]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
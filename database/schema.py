@@ -1,12 +1,13 @@
+import os
 from datetime import datetime
-from uuid import uuid1
 
 import PIL
 import bleach
 from PIL import Image
 from marshmallow import Schema, fields, ValidationError, validates, post_load
 from werkzeug.datastructures import FileStorage
-from werkzeug.utils import secure_filename
+from storage import IMAGES, save_stream
+from storage.delivery import image_url
 from .models import (User, Role, Product, Category, Order, CategoryRequest,
                      ManagerCreationRequests, ProductImage)
 
@@ -18,6 +19,21 @@ def clean(string):
     return string
 
 
+def sniff_image_format(stream):
+    """
+    Returns the format of an image, 'jpeg', 'png' or 'webp', from its first bytes, or None if it is none of them.
+    """
+    header = stream.read(12)
+    stream.seek(0)
+    if header.startswith(b'\xff\xd8\xff'):
+        return 'jpeg'
+    elif header.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    elif header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
 def validate_password(password):
     if len(password) < 8:
         raise ValidationError("Password must be at least 8 characters long")
@@ -368,6 +384,48 @@ class OrderSchema(Schema):
             del kwargs
 
 
+class OrderItemSchema(Schema):
+    """
+    :class:`OrderItemSchema` class for deserializing one item of a cart.
+
+    Attributes
+        - product_id (Int): The ID of the product ordered.
+        - quantity (Int): The quantity of the product ordered.
+
+    """
+    product_id = fields.Int(required=True, strict=True)
+    quantity = fields.Int(required=True, strict=True)
+
+    @validates('quantity')
+    def validate_quantity(self, quantity):
+        if quantity <= 0:
+            raise ValidationError("Quantity must be greater than zero")
+
+
+class CartSchema(Schema):
+    """
+    :class:`CartSchema` class for deserializing a cart, i.e. the items of several orders placed at once.
+    Products are not looked up here, :meth:`Order.place_many` checks all of them with a single query.
+
+    Attributes
+        - items (List[OrderItemSchema]): The items of the cart, at most MAX_ITEMS.
+
+    Methods
+        - validate_items(items): Validates the items field.
+
+    """
+    MAX_ITEMS = 100
+
+    items = fields.List(fields.Nested(OrderItemSchema), required=True)
+
+    @validates('items')
+    def validate_items(self, items):
+        if not items:
+            raise ValidationError("Cart must contain at least one item")
+        elif len(items) > self.MAX_ITEMS:
+            raise ValidationError("Cart must contain at most {} items".format(self.MAX_ITEMS))
+
+
 class CategoryRequestSchema(Schema):
     """
     :class:`CategoryRequestSchema` class for serializing and deserializing CategoryRequest objects.
@@ -520,20 +578,28 @@ class ProductImageSchema(Schema):
         - id (Int, optional): The ID of the product image. (read-only)
         - image_name (Str): The name of the product image.
         - image_path (Str, optional): The path of the product image. (read-only)
+        - status (Str, optional): The processing status of the product image. (read-only)
+        - renditions (Dict, optional): The renditions of the product image by size and format. (read-only)
         - image_file (FileStorage, write-only): The file object of the product image.
 
     Methods
         - validate_image_file(image_file): Validates the image_file field.
         - make_product_image(data): Creates a ProductImage object from the serialized data.
     """
+    MAX_BYTES = 2 * 1024 * 1024
+    # decoding takes about 4 bytes a pixel, so these bound the memory the worker needs for an image
+    MAX_DIMENSION = 6000
+    MAX_PIXELS = 24 * 1000 * 1000
 
     class Meta:
         model = ProductImage
-        fields = ('id', 'image_name', 'image_path', 'image_file', 'products')
+        fields = ('id', 'image_name', 'image_path', 'status', 'renditions', 'image_file', 'products')
 
     id = fields.Int(dump_only=True)
     image_name = fields.Str(dump_only=True)
     image_path = fields.Method('get_image_path', dump_only=True)
+    status = fields.Str(dump_only=True)
+    renditions = fields.Dict(dump_only=True)
     image_file = fields.Raw(load_only=True, type='file', required=True)
     products = fields.Nested('ProductSchema', exclude=('image',))
 
@@ -554,27 +620,49 @@ class ProductImageSchema(Schema):
             raise ValidationError("Image file is required")
         elif not image_file.content_type.startswith('image'):
             raise ValidationError("Uploaded file must be an image")
-        elif image_file.content_length > 2 * 1024 * 1024:
+        # the request itself is capped at MAX_CONTENT_LENGTH while it is received, content_length of a part is
+        # usually not sent, the size of the spooled file is
+        stream = image_file.stream
+        stream.seek(0, os.SEEK_END)
+        size = stream.tell()
+        stream.seek(0)
+        if size > self.MAX_BYTES:
             raise ValidationError("Image file must be less than 2MB")
+        image_format = sniff_image_format(stream)
+        if image_format is None:
+            raise ValidationError("Image file must be one of {}".format(['jpg', 'jpeg', 'png', 'webp']))
+        too_large = "Image must be at most {0}x{0} pixels and {1} pixels in total".format(self.MAX_DIMENSION,
+                                                                                         self.MAX_PIXELS)
+        try:
+            # reads the header only, no pixel is decoded here
+            with Image.open(stream, formats=[image_format.upper()]) as image:
+                width, height = image.size
+        except Image.DecompressionBombError:
+            raise ValidationError(too_large)
+        except PIL.UnidentifiedImageError:
+            raise ValidationError("Image file is not a valid {} image".format(image_format))
+        finally:
+            stream.seek(0)
+        if width > self.MAX_DIMENSION or height > self.MAX_DIMENSION or width * height > self.MAX_PIXELS:
+            raise ValidationError(too_large)
 
     @staticmethod
     def get_image_path(obj):
-        return 'static/images/{}'.format(obj.image_name)
+        return image_url(obj.image_name)
 
     @post_load()
     def make_product_image(self, data,**kwargs):
         try:
             image_file = data.get('image_file')
-            # uuid1().hex is a unique string which is usually safe, but we use secure_filename() to be extra safe
-            image_name = secure_filename(uuid1().hex) + '.png'
-            image = Image.open(image_file.stream)
-            image.convert('RGB')
-            image.thumbnail((300, 300))
-            image.save('static/images/{}'.format(image_name))
-
-            data['image_name'] = image_name
-            data.pop('image_file')
-            return ProductImage(**data)
+            # the pixels are decoded by the worker making the renditions
+            image_format = sniff_image_format(image_file.stream)
+            # the name is the hash of the file, so an identical upload reuses the image uploaded first
+            original_name, exists = save_stream(IMAGES, image_file.stream, image_format)
+            if exists:
+                existing = ProductImage.query.filter_by(original_name=original_name).first()
+                if existing:
+                    return existing
+            return ProductImage(image_name=original_name, original_name=original_name, status='pending')
         except PIL.UnidentifiedImageError as e:
             raise ValidationError("Image file must be one of {}".format(['jpg', 'jpeg', 'png', 'webp']))
         except TypeError as e:
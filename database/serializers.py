@@ -0,0 +1,116 @@
+from datetime import date, datetime, time
+
+import orjson
+from flask import Response
+from marshmallow import fields, missing
+
+from .schema import ProductSchema, CategorySchema, OrderSchema
+
+CONVERTERS = {
+    fields.Integer: int,
+    fields.Float: float,
+    fields.String: str,
+    fields.Boolean: bool,
+}
+
+
+def infer(field, name):
+    # fields.Inferred picks the field class from the type of the value, only dates and times need converting
+    def convert(value, obj):
+        if isinstance(value, (datetime, date, time)):
+            return value.isoformat()
+        elif isinstance(value, (int, float, str, bool)):
+            return value
+        return field._serialize(value, name, obj)
+
+    return convert
+
+
+def converter(field, name):
+    """
+    Returns a function converting the value of a field to its serialized form, or None if the field has
+    no fast path and has to be serialized by marshmallow itself.
+    """
+    if type(field) in CONVERTERS and not getattr(field, 'as_string', False):
+        convert = CONVERTERS[type(field)]
+        return lambda value, obj: convert(value)
+    elif type(field) is fields.Date and field.format not in (None, 'iso', 'iso8601', 'rfc', 'rfc822'):
+        date_format = field.format
+        return lambda value, obj: value.strftime(date_format)
+    elif type(field) in (fields.Date, fields.DateTime) and field.format in (None, 'iso', 'iso8601'):
+        return lambda value, obj: value.isoformat()
+    elif type(field) is fields.Nested:
+        nested = compile_schema(field.schema)
+        if field.many:
+            return lambda value, obj: [nested(item) for item in value]
+        return lambda value, obj: nested(value)
+    elif type(field) is fields.Inferred:
+        return infer(field, name)
+    return None
+
+
+def compile_schema(schema):
+    """
+    Compiles a schema instance into a function dumping one object to the same dict as schema.dump(obj).
+
+    The function is generated once, as straight-line Python code reading every dumped field in turn,
+    so dumping does not go through marshmallow's per-field machinery at all. Fields without a fast path
+    are serialized by marshmallow itself, so the output is always the same.
+    """
+    namespace = {'missing': missing}
+    lines = ['def dump(obj):', '    data = {}']
+    for i, (name, field) in enumerate(schema.dump_fields.items()):
+        key = field.data_key or name
+        if type(field) is fields.Method and field.serialize_method_name:
+            namespace['method_%d' % i] = getattr(schema, field.serialize_method_name)
+            lines.append('    data[%r] = method_%d(obj)' % (key, i))
+            continue
+        convert = converter(field, name)
+        if convert is None:
+            namespace['field_%d' % i] = field
+            namespace['schema_%d' % i] = schema
+            lines.append('    value = field_%d.serialize(%r, obj, accessor=schema_%d.get_attribute)' % (i, name, i))
+            lines.append('    if value is not missing:')
+            lines.append('        data[%r] = value' % key)
+            continue
+        namespace['convert_%d' % i] = convert
+        lines.append('    value = getattr(obj, %r, missing)' % (field.attribute or name))
+        if field.dump_default is not missing:
+            namespace['default_%d' % i] = field.dump_default
+            default = 'default_%d()' % i if callable(field.dump_default) else 'default_%d' % i
+            lines.append('    if value is missing:')
+            lines.append('        value = %s' % default)
+        lines.append('    if value is not missing:')
+        lines.append('        data[%r] = None if value is None else convert_%d(value, obj)' % (key, i))
+    lines.append('    return data')
+    exec('\n'.join(lines), namespace)
+    return namespace['dump']
+
+
+class Serializer:
+    """
+    :class:`Serializer` dumps ORM objects (or Row tuples) like the schema it was compiled from, without going through
+    marshmallow on every call. Schemas are still used for loading and validation.
+
+    Methods
+        - dump(obj, many=False): Returns the same data as schema.dump(obj, many=many).
+    """
+
+    def __init__(self, schema):
+        self._dump = compile_schema(schema)
+
+    def dump(self, obj, many=False):
+        if many:
+            return [self._dump(item) for item in obj]
+        return self._dump(obj)
+
+
+def json_response(data, status=200):
+    # keys are sorted and a newline is appended, like jsonify does
+    return Response(orjson.dumps(data, option=orjson.OPT_SORT_KEYS) + b'\n', status=status,
+                    mimetype='application/json')
+
+
+product_serializer = Serializer(ProductSchema())
+category_serializer = Serializer(CategorySchema())
+order_serializer = Serializer(OrderSchema())
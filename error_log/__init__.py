@@ -1,6 +1,8 @@
 import logging
 
 logger = logging.getLogger(__name__)
+# errors go to error.log, outcomes such as the summaries of the mail jobs only to the stream
+logger.setLevel(logging.INFO)
 file_handler = logging.FileHandler('error.log')
 file_handler.setLevel(logging.ERROR)
 logger.addHandler(file_handler)
@@ -1,5 +1,7 @@
 from flask_mail import Mail, Message
 
+from error_log import logger
+
 mail = Mail()
 
 
@@ -7,11 +9,49 @@ def init_mail(app):
     mail.init_app(app)
 
 
-def send_mail(subject, sender, recipients, text_body=None, html_body=None):
+def make_message(subject, sender, recipients, text_body=None, html_body=None):
     msg = Message(subject=subject, sender=sender, recipients=recipients)
     if text_body:
         msg.body = text_body
     if html_body:
         msg.html = html_body
-    mail.send(msg)
+    return msg
+
+
+def send_mail(subject, sender, recipients, text_body=None, html_body=None):
+    mail.send(make_message(subject, sender, recipients, text_body, html_body))
+
+
+def disconnect(connection):
+    if connection is not None:
+        try:
+            connection.__exit__(None, None, None)
+        except Exception as e:
+            logger.error(e)
+    return None
+
+
+def send_many(messages):
+    """
+    Sends many messages over one SMTP connection instead of opening one per message like :func:`send_mail`.
+    Flask-Mail reconnects after every MAIL_MAX_EMAILS messages, and the connection is also reopened after a failed
+    message, which is logged and counted without stopping the others.
+
+    :param messages: iterable of :class:`Message`, consumed lazily.
+    :return: (number of messages sent, number of messages failed)
+    """
+    sent = failed = 0
+    connection = None
+    for msg in messages:
+        try:
+            if connection is None:
+                connection = mail.connect().__enter__()
+            connection.send(msg)
+            sent += 1
+        except Exception as e:
+            logger.error(e)
+            failed += 1
+            connection = disconnect(connection)
+    disconnect(connection)
+    return sent, failed
 
@@ -1,156 +1,165 @@
+from celery import chord
+from flask import current_app
+
+from config import get_config
 from scheduled_jobs import celery
-from . import mail, send_mail
+from . import mail, make_message, send_many
+from .templates import render
+from database import db
 from database.models import User, Order, Role
-import pyhtml as h
 from datetime import datetime, timedelta, date
-
-
-def reminder1(username):
-    msg = h.html(
-        h.head(
-            h.h1('Reminder')
-        ),
-        h.body(
-            h.h1('Reminder'),
-            h.p('Your cart is empty'),
-            h.p('Please add items to your cart'),
-            h.p('Thank you for using grocery store.')
-        ),
-    )
-    return msg.render()
-
-
-def reminder2(username, no_of_items):
-    msg = h.html(
-        h.head(
-            h.h1('Reminder')
-        ),
-        h.body(
-            h.h1('Reminder'),
-            h.p('Your cart has ', no_of_items, ' items'),
-            h.p('Please checkout'),
-            h.p('Thank you for using grocery store.')
-        ),
-    )
-    return msg.render()
+from error_log import logger
+
+
+def recipients(first_id=None, end_id=None):
+    """
+    Returns the condition selecting the users who get the reminder and report mails, with first_id <= id < end_id
+    when the bounds are given.
+    """
+    condition = Role.role_name == 'user'
+    if first_id is not None:
+        condition = db.and_(condition, User.id >= first_id)
+    if end_id is not None:
+        condition = db.and_(condition, User.id < end_id)
+    return condition
+
+
+def recipient_ranges(chunk_size):
+    """
+    Returns (first_id, end_id) bounds splitting the recipients into ranges of chunk_size users, the last one open
+    ended with end_id None. Only the id of every chunk_size-th recipient is fetched, the rows of a range are queried
+    by the task that sends it.
+    """
+    numbered = (db.select(User.id, db.func.row_number().over(order_by=User.id).label('number'))
+                .join(Role, User.role_id == Role.id)
+                .where(recipients())
+                .subquery())
+    first_ids = db.session.scalars(db.select(numbered.c.id)
+                                   .where((numbered.c.number - 1) % chunk_size == 0)
+                                   .order_by(numbered.c.id)).all()
+    return list(zip(first_ids, first_ids[1:] + [None]))
+
+
+def unconfirmed_order_counts(first_id=None, end_id=None, batch_size=1000):
+    """
+    Returns (username, email, number of unconfirmed orders) of every user with first_id <= id < end_id, with a
+    single grouped query whose rows are fetched batch_size at a time, so memory stays flat however many users there
+    are.
+    """
+    query = (db.select(User.username, User.email, db.func.count(Order.id))
+             .join(Role, User.role_id == Role.id)
+             .outerjoin(Order, db.and_(Order.user_id == User.id, Order.confirmed == False))
+             .where(recipients(first_id, end_id))
+             .group_by(User.id, User.username, User.email)
+             .execution_options(yield_per=batch_size))
+    return db.session.execute(query)
+
+
+def reminder_message(username, email, no_of_items):
+    if no_of_items == 0:
+        body = render('reminder_empty_cart', username=username)
+    else:
+        body = render('reminder_pending_cart', username=username, no_of_items=no_of_items)
+    return dict(subject='Grocery app reminder',
+                sender="reminder@grocery.com",
+                recipients=[email],
+                **body)
 
 
 @celery.task(name='send_reminder_mail')
 def send_reminder_mail():
-    user_role = Role.query.filter_by(role_name='user').first()
-    users = User.query.filter_by(role_id=user_role.id).all()
-    for user in users:
-        orders = Order.query.filter_by(user_id=user.id, confirmed=False).all()
-        if len(orders) == 0:
-            send_mail(subject='Grocery app reminder',
-                      sender="reminder@grocery.com",
-                      recipients=[user.email],
-                      html_body=reminder1(user.username))
-        else:
-            send_mail(subject='Grocery app reminder',
-                      sender="reminder@grocery.com",
-                      recipients=[user.email],
-                      html_body=reminder2(user.username, len(orders)))
-    print('daily mail sent')
-
-
-def monthly_reminder1(username):
-    msg = h.html(
-        h.head(
-            h.h1('We missed you')
-        ),
-        h.body(
-            h.p('Dear {}'.format(username)),
-            h.p('You have not placed any orders this month'),
-            h.p('Please place an order'),
-            h.p('Thank you for using grocery store.')
-        ),
-    )
-    return msg.render()
-
-
-def monthly_reminder2(username):
-    msg = h.html(
-        h.head(
-            h.h1('We are waiting for you')
-        ),
-        h.body(
-            h.p('Dear {}'.format(username)),
-            h.p('You have placed orders this month'),
-            h.p('Please checkout'),
-            h.p('Thank you for using grocery store.')
-        )
-    )
-    return msg.render()
-
-
-def monthly_reminder3(username, no_of_confirmed, no_of_unconfirmed, value_of_confirmed):
-    msg = h.html(
-        h.head(
-            h.h1('We are waiting for you')
-        ),
-        h.body(
-            h.p('Dear {}'.format(username)),
-            h.p('You have placed {} orders this month'.format(no_of_confirmed + no_of_unconfirmed)),
-            h.p('You have confirmed {} orders this month'.format(no_of_confirmed)),
-            h.p('You have unconfirmed {} orders this month'.format(no_of_unconfirmed)),
-            h.p('The total value of confirmed orders is {}'.format(value_of_confirmed)),
-            h.p('Please checkout'),
-            h.p('Thank you for using grocery store.')
-        )
-    )
-    return msg.render()
-
-
-def monthly_reminder4(username, no_of_confirmed, value_of_confirmed):
-    msg = h.html(
-        h.head(
-            h.h1('We are waiting for you')
-        ),
-        h.body(
-            h.p('Dear {}'.format(username)),
-            h.p('You have placed {} orders this month'.format(no_of_confirmed)),
-            h.p('The total value of confirmed orders is {}'.format(value_of_confirmed)),
-            h.p('Thank you for using grocery store.')
-        )
-    )
-    return msg.render()
+    return fan_out('reminder')
+
+
+def monthly_order_totals(since, first_id=None, end_id=None, batch_size=1000):
+    """
+    Returns (username, email, confirmed orders, unconfirmed orders, value of confirmed orders) of every user with
+    first_id <= id < end_id, counting the orders placed after since. A single grouped query with conditional
+    aggregates, streamed batch_size rows at a time, so the orders themselves are never loaded.
+    """
+    confirmed = Order.confirmed == True
+    query = (db.select(User.username, User.email,
+                       db.func.count(db.case((confirmed, Order.id))),
+                       db.func.count(db.case((~confirmed, Order.id))),
+                       db.func.coalesce(db.func.sum(db.case((confirmed, Order.value))), 0))
+             .join(Role, User.role_id == Role.id)
+             .outerjoin(Order, db.and_(Order.user_id == User.id, Order.order_time > since))
+             .where(recipients(first_id, end_id))
+             .group_by(User.id, User.username, User.email)
+             .execution_options(yield_per=batch_size))
+    return db.session.execute(query)
+
+
+def report_message(username, email, no_of_confirmed, no_of_unconfirmed, value_of_confirmed):
+    if no_of_confirmed == 0 and no_of_unconfirmed == 0:
+        body = render('monthly_no_orders', username=username)
+    elif no_of_confirmed == 0:
+        body = render('monthly_unconfirmed', username=username)
+    elif no_of_unconfirmed > 0:
+        body = render('monthly_mixed', username=username, no_of_confirmed=no_of_confirmed,
+                      no_of_unconfirmed=no_of_unconfirmed, value_of_confirmed=value_of_confirmed)
+    else:
+        body = render('monthly_confirmed', username=username, no_of_confirmed=no_of_confirmed,
+                      value_of_confirmed=value_of_confirmed)
+    return dict(subject='Grocery app reminder',
+                sender="report@.grocery.com",
+                recipients=[email],
+                **body)
 
 
 @celery.task(name='send_monthly_report')
 def send_monthly_report():
-    user_role = Role.query.filter_by(role_name='user').first()
-    users = User.query.filter_by(role_id=user_role.id).all()
-    for user in users:
-        today = date.today()
-        one_month_ago = today - timedelta(days=30)
-        orders = Order.query.filter_by(user_id=user.id).filter(Order.order_time > one_month_ago).all()
-        confirmed = [order for order in orders if order.confirmed]
-        unconfirmed = [order for order in orders if not order.confirmed]
-        if len(orders) == 0:
-            send_mail(subject='Grocery app reminder',
-                      sender="report@.grocery.com",
-                      recipients=[user.email],
-                      html_body=monthly_reminder1(user.username))
-        elif len(confirmed) == 0 and len(unconfirmed) > 0:
-            send_mail(subject='Grocery app reminder',
-                      sender="report@.grocery.com",
-                      recipients=[user.email],
-                      html_body=monthly_reminder2(user.username))
-        elif len(confirmed) > 0 and len(unconfirmed) > 0:
-            no_of_confirmed = len(confirmed)
-            no_of_unconfirmed = len(unconfirmed)
-            value_of_confirmed = sum([order.value for order in confirmed])
-            send_mail(subject='Grocery app reminder',
-                      sender="report@.grocery.com",
-                      recipients=[user.email],
-                      html_body=monthly_reminder3(user.username, no_of_confirmed, no_of_unconfirmed,
-                                                  value_of_confirmed))
-        elif len(confirmed) > 0 and len(unconfirmed) == 0:
-            no_of_confirmed = len(confirmed)
-            value_of_confirmed = sum([order.value for order in confirmed])
-            send_mail(subject='Grocery app reminder',
-                      sender="report@.grocery.com",
-                      recipients=[user.email],
-                      html_body=monthly_reminder4(user.username, no_of_confirmed, value_of_confirmed))
-    print('monthly mail sent')
+    one_month_ago = date.today() - timedelta(days=30)
+    return fan_out('report', one_month_ago)
+
+
+ROWS = {
+    'reminder': unconfirmed_order_counts,
+    'report': monthly_order_totals,
+}
+
+MESSAGES = {
+    'reminder': reminder_message,
+    'report': report_message,
+}
+
+
+@celery.task(name='send_mail_chunk', rate_limit=get_config().MAIL_CHUNK_RATE_LIMIT)
+def send_mail_chunk(kind, first_id, end_id, *args):
+    """
+    Sends the mails of the recipients with first_id <= id < end_id over a single SMTP connection, streaming their
+    rows from the ROWS query of kind, called with args. A failed mail is logged and counted, it does not stop the
+    chunk.
+    """
+    rows = ROWS[kind](*args, first_id=first_id, end_id=end_id)
+    sent, failed = send_many(make_message(**MESSAGES[kind](*row)) for row in rows)
+    return {'sent': sent, 'failed': failed}
+
+
+@celery.task(name='mail_summary')
+def mail_summary(results, kind):
+    summary = {'kind': kind,
+               'chunks': len(results),
+               'sent': sum(result['sent'] for result in results),
+               'failed': sum(result['failed'] for result in results)}
+    message = '{kind} mail sent: {sent} sent, {failed} failed in {chunks} chunks'.format(**summary)
+    if summary['failed']:
+        logger.warning(message)
+    else:
+        logger.info(message)
+    return summary
+
+
+def fan_out(kind, *args):
+    """
+    Partitions the recipients of one of the MESSAGES kinds into ranges of MAIL_CHUNK_SIZE user ids and sends them as
+    a chord of :func:`send_mail_chunk` tasks, spread over the workers, whose results are added up by
+    :func:`mail_summary`. Only the bounds of the ranges and args go through the broker, each task queries its rows.
+
+    :return: the id of the :func:`mail_summary` task, which is queued right away when there is no recipient.
+    """
+    ranges = recipient_ranges(current_app.config['MAIL_CHUNK_SIZE'])
+    if not ranges:
+        return mail_summary.delay([], kind).id
+    return chord(send_mail_chunk.s(kind, first_id, end_id, *args)
+                 for first_id, end_id in ranges)(mail_summary.s(kind)).id
@@ -0,0 +1,47 @@
+from flask import current_app
+
+from database import db
+from database.models import FailedMail
+from error_log import logger
+from scheduled_jobs import celery, enqueue
+from . import send_mail
+
+
+def backoff(retries):
+    # 10s, 20s, 40s, ... with the default config, capped at MAIL_RETRY_BACKOFF_MAX
+    return min(current_app.config['MAIL_RETRY_BACKOFF'] * 2 ** retries, current_app.config['MAIL_RETRY_BACKOFF_MAX'])
+
+
+def dead_letter(subject, sender, recipients, text_body, html_body, error, attempts):
+    logger.error('mail "{}" to {} failed after {} attempts: {}'.format(subject, recipients, attempts, error))
+    db.session.add(FailedMail(subject, sender, recipients, text_body, html_body, str(error), attempts))
+    db.session.commit()
+
+
+@celery.task(name='send_transactional_mail', bind=True, ignore_result=True)
+def send_transactional_mail(self, subject, sender, recipients, text_body=None, html_body=None):
+    """
+    Sends one mail, retrying with exponential backoff while SMTP fails. A mail still failing after MAIL_MAX_RETRIES
+    retries is recorded as a :class:`FailedMail`.
+    """
+    try:
+        send_mail(subject, sender, recipients, text_body, html_body)
+        return True
+    except Exception as e:
+        if self.request.retries >= current_app.config['MAIL_MAX_RETRIES']:
+            dead_letter(subject, sender, recipients, text_body, html_body, e, self.request.retries + 1)
+            return False
+        raise self.retry(exc=e, countdown=backoff(self.request.retries),
+                         max_retries=current_app.config['MAIL_MAX_RETRIES'])
+
+
+def queue_mail(subject, sender, recipients, text_body=None, html_body=None):
+    """
+    Queues a mail for :func:`send_transactional_mail` instead of sending it in the request. Call it once the changes
+    the mail is about have been committed. If the broker cannot be reached the mail goes straight to the dead letters,
+    the request itself does not fail.
+    """
+    try:
+        enqueue(send_transactional_mail, subject, sender, recipients, text_body, html_body)
+    except Exception as e:
+        dead_letter(subject, sender, recipients, text_body, html_body, e, 0)
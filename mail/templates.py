@@ -1,97 +1,110 @@
-import pyhtml as h
-
-
-def manager_created(username: str):
-    msg = h.html(
-        h.head(
-            h.h1('Manager Request Created')
-        ),
-        h.body(
-            h.h1('Manager Request Created'),
-            h.p('Your manager request has been created successfully'),
-            h.p('Your username is: ', username),
-            h.p('Please wait for approval'),
-            h.p('Thank you for using grocery store.')
-        ),
-    )
-    return msg.render()
-
-
-def manager_approved(user_id: int, username: str):
-    msg = h.html(
-        h.head(
-            h.h1('Manager Approved')
-        ),
-        h.body(
-            h.h1('Manager Request Approved'),
-            h.p('Your manager request has been approved successfully'),
-            h.p('Your username is: ', username),
-            h.p('Your user id is: ', user_id),
-            h.p('You can now add products to the store'),
-            h.p('Thank you for using grocery store.')
-        ),
-    )
-    return msg.render()
-
-
-def manager_rejected():
-    msg = h.html(
-        h.head(
-            h.h1('Manager Rejected')
-        ),
-        h.body(
-            h.h1('Manager Request Rejected'),
-            h.p('Your manager request has been rejected'),
-            h.p('Thank you for using grocery store.')
-        ),
-    )
-
-    return msg.render()
-
-
-def category_created(category_name: str):
-    msg = h.html(
-        h.head(
-            h.h1('Category Request Created')
-        ),
-        h.body(
-            h.h1('Category Request Created'),
-            h.p('Your category request has been created successfully'),
-            h.p('Your category name is: ', category_name),
-            h.p('Please wait for approval'),
-            h.p('Thank you for using grocery store.')
-        ),
-    )
-
-    return msg.render()
-
-
-def category_approved(category_name: str):
-    msg = h.html(
-        h.head(
-            h.h1('Category Approved')
-        ),
-        h.body(
-            h.h1('Category Request Approved'),
-            h.p('Your category request has been approved successfully'),
-            h.p('Your category name is: ', category_name),
-            h.p('You can now add products to the store'),
-            h.p('Thank you for using grocery store.')
-        ),
-    )
-    return msg.render()
-
-
-def category_rejected():
-    msg = h.html(
-        h.head(
-            h.h1('Category Rejected')
-        ),
-        h.body(
-            h.h1('Category Request Rejected'),
-            h.p('Your category request has been rejected'),
-            h.p('Thank you for using grocery store.')
-        ),
-    )
-
-    return msg.render()
+"""
+Mail templates. Every mail is compiled once, when this module is imported, into a Jinja2 template for its HTML part
+and one for its plain text part; rendering a mail for a recipient only substitutes the recipient's values.
+
+    send_mail(subject=..., sender=..., recipients=[...], **render('manager_created', username=username))
+"""
+from jinja2 import Environment, StrictUndefined
+
+html_env = Environment(autoescape=True, undefined=StrictUndefined)
+text_env = Environment(autoescape=False, undefined=StrictUndefined)
+
+THANKS = 'Thank you for using grocery store.'
+
+# name: (title, heading or None, paragraphs), paragraphs may use Jinja2 expressions
+MAILS = {
+    'manager_created': ('Manager Request Created', 'Manager Request Created', [
+        'Your manager request has been created successfully',
+        'Your username is: {{ username }}',
+        'Please wait for approval',
+    ]),
+    'manager_approved': ('Manager Approved', 'Manager Request Approved', [
+        'Your manager request has been approved successfully',
+        'Your username is: {{ username }}',
+        'Your user id is: {{ user_id }}',
+        'You can now add products to the store',
+    ]),
+    'manager_rejected': ('Manager Rejected', 'Manager Request Rejected', [
+        'Your manager request has been rejected',
+    ]),
+    'category_created': ('Category Request Created', 'Category Request Created', [
+        'Your category request has been created successfully',
+        'Your category name is: {{ category_name }}',
+        'Please wait for approval',
+    ]),
+    'category_approved': ('Category Approved', 'Category Request Approved', [
+        'Your category request has been approved successfully',
+        'Your category name is: {{ category_name }}',
+        'You can now add products to the store',
+    ]),
+    'category_rejected': ('Category Rejected', 'Category Request Rejected', [
+        'Your category request has been rejected',
+    ]),
+    'reminder_empty_cart': ('Reminder', 'Reminder', [
+        'Your cart is empty',
+        'Please add items to your cart',
+    ]),
+    'reminder_pending_cart': ('Reminder', 'Reminder', [
+        'Your cart has {{ no_of_items }} items',
+        'Please checkout',
+    ]),
+    'monthly_no_orders': ('We missed you', None, [
+        'Dear {{ username }}',
+        'You have not placed any orders this month',
+        'Please place an order',
+    ]),
+    'monthly_unconfirmed': ('We are waiting for you', None, [
+        'Dear {{ username }}',
+        'You have placed orders this month',
+        'Please checkout',
+    ]),
+    'monthly_mixed': ('We are waiting for you', None, [
+        'Dear {{ username }}',
+        'You have placed {{ no_of_confirmed + no_of_unconfirmed }} orders this month',
+        'You have confirmed {{ no_of_confirmed }} orders this month',
+        'You have unconfirmed {{ no_of_unconfirmed }} orders this month',
+        'The total value of confirmed orders is {{ value_of_confirmed }}',
+        'Please checkout',
+    ]),
+    'monthly_confirmed': ('We are waiting for you', None, [
+        'Dear {{ username }}',
+        'You have placed {{ no_of_confirmed }} orders this month',
+        'The total value of confirmed orders is {{ value_of_confirmed }}',
+    ]),
+}
+
+
+def html_source(title, heading, paragraphs):
+    lines = ['<!DOCTYPE html>', '<html>', '  <head>', '    <h1>{}</h1>'.format(title), '  </head>', '  <body>']
+    if heading:
+        lines.append('    <h1>{}</h1>'.format(heading))
+    lines += ['    <p>{}</p>'.format(paragraph) for paragraph in paragraphs + [THANKS]]
+    lines += ['  </body>', '</html>']
+    return '\n'.join(lines)
+
+
+def text_source(title, heading, paragraphs):
+    return '\n\n'.join(([heading] if heading else []) + paragraphs + [THANKS])
+
+
+class MailTemplate:
+    """
+    :class:`MailTemplate` is a mail compiled into an HTML and a plain text template.
+
+    Methods
+        - render(**context): Returns the html_body and text_body keyword arguments of send_mail.
+    """
+
+    def __init__(self, title, heading, paragraphs):
+        self.html = html_env.from_string(html_source(title, heading, paragraphs))
+        self.text = text_env.from_string(text_source(title, heading, paragraphs))
+
+    def render(self, **context):
+        return {'html_body': self.html.render(context), 'text_body': self.text.render(context)}
+
+
+templates = {name: MailTemplate(*mail) for name, mail in MAILS.items()}
+
+
+def render(name, **context):
+    return templates[name].render(**context)
@@ -14,6 +14,12 @@ celery = Celery('__main__', broker='redis://localhost:6379/1', backend='redis://
 celery.conf.timezone = "Asia/Kolkata"
 
 
-
-
-
+def enqueue(task, *args):
+    """
+    Queues task(*args) from a web request. A broker that is down must not hang the request: the connection is retried
+    once, immediately, and the publish not at all. Raises the connection error if the task could not be queued.
+    Tasks queued this way should ignore their result, or the result backend is subscribed to on every call.
+    """
+    with celery.pool.acquire(block=True) as connection:
+        connection.ensure_connection(max_retries=1, interval_start=0)
+        return task.apply_async(args, connection=connection, retry=False)
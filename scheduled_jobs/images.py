@@ -0,0 +1,74 @@
+import io
+from datetime import datetime, timedelta
+
+from PIL import Image, ImageOps
+
+from database import db
+from database.models import ProductImage
+from error_log import logger
+from storage import IMAGES, get_storage, key, save_bytes
+from . import celery
+
+# name: bounding box, every rendition keeps the aspect ratio of the original
+RENDITIONS = {
+    'thumbnail': (150, 150),
+    'listing': (300, 300),
+    'detail': (800, 800),
+}
+# WebP for the clients supporting it, PNG as the fallback
+FORMATS = ('webp', 'png')
+# image_name, i.e. what clients not aware of renditions get, is the rendition images were resized to before
+DEFAULT_RENDITION = ('listing', 'png')
+
+
+def make_renditions(original_name):
+    """
+    Decodes the original once and writes every rendition of it in every format, each named after the hash of its
+    bytes, see :func:`storage.save_bytes`.
+
+    :return: the name of every rendition by size and format.
+    """
+    with get_storage().open(key(IMAGES, original_name)) as f, Image.open(f) as original:
+        # phone photos are stored sideways with an EXIF orientation
+        original = ImageOps.exif_transpose(original)
+        original = original.convert('RGBA' if 'A' in original.getbands() or 'transparency' in original.info else 'RGB')
+        renditions = {}
+        for rendition, size in RENDITIONS.items():
+            image = original.copy()
+            image.thumbnail(size)
+            renditions[rendition] = {}
+            for image_format in FORMATS:
+                buffer = io.BytesIO()
+                image.save(buffer, format=image_format.upper())
+                renditions[rendition][image_format] = save_bytes(IMAGES, buffer.getvalue(), image_format)
+    return renditions
+
+
+@celery.task(name='process_product_image', ignore_result=True)
+def process_product_image(image_id):
+    image = ProductImage.query.get(image_id)
+    if image is None or image.status == 'ready':
+        return
+    try:
+        image.renditions = make_renditions(image.original_name)
+        rendition, image_format = DEFAULT_RENDITION
+        image.image_name = image.renditions[rendition][image_format]
+        image.status = 'ready'
+    except Exception as e:
+        logger.error(e)
+        image.status = 'failed'
+    db.session.commit()
+    # products are listed with the name and status of their image, imported here as cache imports the app
+    from cache import invalidate
+    invalidate('catalog')
+    print('processed image {}: {}'.format(image_id, image.status))
+
+
+@celery.task(name='process_pending_images')
+def process_pending_images():
+    # uploads whose processing could not be queued, e.g. while the broker was down
+    stale = datetime.now() - timedelta(minutes=10)
+    images = ProductImage.query.filter(ProductImage.status == 'pending', ProductImage.uploaded_on < stale).all()
+    for image in images:
+        process_product_image.delay(image.id)
+    return len(images)
@@ -0,0 +1,18 @@
+from database import db
+from . import celery
+
+
+@celery.task(name='optimize_database')
+def optimize_database():
+    # Keeps the planner statistics of the new indexes up to date. On SQLite, PRAGMA optimize only analyzes the
+    # tables that need it, and the checkpoint keeps the WAL file from growing between restarts.
+    if db.engine.dialect.name == 'sqlite':
+        statements = ['PRAGMA optimize', 'PRAGMA wal_checkpoint(TRUNCATE)']
+    else:
+        statements = ['ANALYZE']
+    with db.engine.connect() as connection:
+        for statement in statements:
+            connection.exec_driver_sql(statement)
+        connection.commit()
+    print('database optimized')
+    return True
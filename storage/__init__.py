@@ -0,0 +1,90 @@
+"""
+Content-addressed file storage: files are named after the SHA-256 of their bytes, so identical files are stored once
+and a name always refers to the same bytes, which lets clients and CDNs cache them forever.
+Files are kept by the storage backend of the app under the key <folder>/<name>, see storage/backends.py.
+"""
+import hashlib
+import io
+import os
+import uuid
+from datetime import datetime, timedelta
+
+from flask import request
+
+from .backends import (CHUNK_SIZE, EXPORTS, FOLDERS, HASHED_NAME, IMAGES, IMMUTABLE_MAX_AGE, get_storage,
+                       make_storage)
+from .delivery import send_static_file
+from .migrate import migrate_storage_command
+
+
+def init_storage(app):
+    app.extensions['storage'] = make_storage(app.config)
+    app.view_functions['static'] = send_static_file
+    app.after_request(cache_immutable_files)
+    app.cli.add_command(migrate_storage_command)
+
+
+def key(folder, name):
+    return '{}/{}'.format(folder, name)
+
+
+def content_name(digest, extension):
+    return '{}.{}'.format(digest, extension)
+
+
+def is_immutable(name):
+    return bool(HASHED_NAME.match(name))
+
+
+def write_once(directory, name, data):
+    """
+    Writes data to directory/name on the local disk unless the file already exists, in which case it already holds
+    the same bytes. The file is written under a temporary name and renamed, so readers never see a partial file.
+    """
+    path = os.path.join(directory, name)
+    if os.path.exists(path):
+        return name
+    temporary = '{}.{}.tmp'.format(path, uuid.uuid4().hex)
+    with open(temporary, 'wb') as f:
+        f.write(data)
+    os.replace(temporary, path)
+    return name
+
+
+def save_bytes(folder, data, extension):
+    name = content_name(hashlib.sha256(data).hexdigest(), extension)
+    storage = get_storage()
+    if not storage.exists(key(folder, name)):
+        storage.put(key(folder, name), io.BytesIO(data))
+    return name
+
+
+def save_stream(folder, stream, extension):
+    """
+    Stores a seekable stream in folder under the hash of its content. The stream is read once to hash it, and once
+    more to store it only if no file has that name yet.
+
+    :return: (name of the file, whether the file already existed)
+    """
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+        digest.update(chunk)
+    stream.seek(0)
+    name = content_name(digest.hexdigest(), extension)
+    storage = get_storage()
+    if storage.exists(key(folder, name)):
+        return name, True
+    storage.put(key(folder, name), stream)
+    return name, False
+
+
+def cache_immutable_files(response):
+    # content-addressed static files never change, browsers and CDNs need not even revalidate them
+    if (request.endpoint == 'static' and response.status_code in (200, 206)
+            and is_immutable(os.path.basename(request.path))):
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+        response.expires = datetime.utcnow() + timedelta(seconds=IMMUTABLE_MAX_AGE)
+    return response
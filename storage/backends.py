@@ -0,0 +1,212 @@
+"""
+Storage backends. Files are stored under keys such as images/<name> or products/<id>.csv, a folder and a name; where
+they actually live is up to the backend configured with STORAGE_BACKEND:
+
+    - LocalStorage keeps them under a root directory, fanned out into two levels of hash-prefixed subdirectories, so
+      no directory grows past a few thousand entries: images/<name> is <root>/images/ab/cd/<name>;
+    - S3Storage keeps them in a bucket of S3 or of any S3-compatible server (MinIO, a local stand-in, ...).
+"""
+import hashlib
+import io
+import mimetypes
+import os
+import re
+import shutil
+import uuid
+
+from flask import current_app
+
+# folders of the backends
+IMAGES = 'images'
+EXPORTS = 'products'
+FOLDERS = (IMAGES, EXPORTS)
+CHUNK_SIZE = 64 * 1024
+HASHED_NAME = re.compile(r'^[0-9a-f]{64}\.[a-z0-9]+$')
+# a year, the longest max-age caches are expected to honour
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def get_storage():
+    return current_app.extensions['storage']
+
+
+def make_storage(config):
+    if config['STORAGE_BACKEND'] == 's3':
+        return S3Storage(config['S3_BUCKET'], endpoint_url=config['S3_ENDPOINT_URL'],
+                         public_url=config['S3_PUBLIC_URL'])
+    return LocalStorage(config['STORAGE_ROOT'])
+
+
+def is_stored(name):
+    # not files being written, nor files such as .gitkeep
+    return not name.endswith('.tmp') and not name.startswith('.')
+
+
+def split_key(key):
+    folder, _, name = key.rpartition('/')
+    return folder, name
+
+
+class Storage:
+    """
+    :class:`Storage` is the interface of the storage backends.
+
+    Methods
+        - put(key, stream): Stores the content of a binary file object under key, replacing the file stored there.
+        - open(key): Returns a binary file object reading the file stored under key.
+        - exists(key): Returns whether a file is stored under key.
+        - delete(key): Deletes the file stored under key, if any.
+        - keys(folder): Returns the keys of the files stored in folder.
+        - url(key, expires_in): Returns the URL of the file, signed and valid for expires_in seconds if given.
+        - local_path(key): Returns the path of the file on the local disk, None if the backend is remote.
+    """
+
+    def put(self, key, stream):
+        raise NotImplementedError
+
+    def open(self, key):
+        raise NotImplementedError
+
+    def exists(self, key):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def keys(self, folder):
+        raise NotImplementedError
+
+    def url(self, key, expires_in=None):
+        raise NotImplementedError
+
+    def local_path(self, key):
+        return None
+
+
+class LocalStorage(Storage):
+    """
+    :class:`LocalStorage` stores files on the local disk, under root. Files stored directly in their folder, as they
+    were before sharding, are still found until :meth:`reshard` moves them.
+    Its URLs are those of Flask's static route, which finds the files through the backend, see storage/delivery.py.
+    """
+
+    def __init__(self, root, base_url='/static/'):
+        self.root = root
+        self.base_url = base_url
+
+    def path(self, key):
+        folder, name = split_key(key)
+        # content-addressed names are spread evenly already, others are spread by their hash
+        digest = name if HASHED_NAME.match(name) else hashlib.sha256(name.encode()).hexdigest()
+        return os.path.join(self.root, folder, digest[:2], digest[2:4], name)
+
+    def flat_path(self, key):
+        folder, name = split_key(key)
+        return os.path.join(self.root, folder, name)
+
+    def local_path(self, key):
+        path = self.path(key)
+        if not os.path.exists(path) and os.path.exists(self.flat_path(key)):
+            return self.flat_path(key)
+        return path
+
+    def put(self, key, stream):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # written under a temporary name and renamed, so readers never see a partial file
+        temporary = '{}.{}.tmp'.format(path, uuid.uuid4().hex)
+        with open(temporary, 'wb') as f:
+            shutil.copyfileobj(stream, f, CHUNK_SIZE)
+        os.replace(temporary, path)
+
+    def open(self, key):
+        return open(self.local_path(key), 'rb')
+
+    def exists(self, key):
+        return os.path.exists(self.local_path(key))
+
+    def delete(self, key):
+        for path in (self.path(key), self.flat_path(key)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def keys(self, folder):
+        for directory, _, names in os.walk(os.path.join(self.root, folder)):
+            for name in names:
+                if is_stored(name):
+                    yield '{}/{}'.format(folder, name)
+
+    def url(self, key, expires_in=None):
+        return self.base_url + key
+
+    def reshard(self, folder):
+        """
+        Moves the files stored directly in folder into their subdirectories.
+
+        :return: the number of files moved.
+        """
+        directory = os.path.join(self.root, folder)
+        if not os.path.isdir(directory):
+            return 0
+        moved = 0
+        for entry in os.scandir(directory):
+            if entry.is_file() and is_stored(entry.name):
+                path = self.path('{}/{}'.format(folder, entry.name))
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(entry.path, path)
+                moved += 1
+        return moved
+
+
+class S3Storage(Storage):
+    """
+    :class:`S3Storage` stores files in an S3 bucket, or in a bucket of any server speaking the S3 API at
+    endpoint_url. Files are downloaded from the bucket itself: from public_url when the bucket is public, else
+    through signed URLs. Needs boto3, which reads the credentials from the usual AWS_* environment variables.
+    """
+
+    def __init__(self, bucket, endpoint_url=None, public_url=None, client=None):
+        if client is None:
+            # only needed with this backend
+            import boto3
+            client = boto3.client('s3', endpoint_url=endpoint_url)
+        self.client = client
+        self.bucket = bucket
+        self.public_url = public_url
+
+    def put(self, key, stream):
+        extra_args = {'ContentType': mimetypes.guess_type(key)[0] or 'application/octet-stream'}
+        if HASHED_NAME.match(split_key(key)[1]):
+            # sent by the bucket itself, with the headers storage.cache_immutable_files gives them when the app does
+            extra_args['CacheControl'] = 'public, max-age={}, immutable'.format(IMMUTABLE_MAX_AGE)
+        self.client.upload_fileobj(stream, self.bucket, key, ExtraArgs=extra_args)
+
+    def open(self, key):
+        # images and exports are small, and Pillow needs a seekable file
+        return io.BytesIO(self.client.get_object(Bucket=self.bucket, Key=key)['Body'].read())
+
+    def exists(self, key):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except self.client.exceptions.ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+                return False
+            raise
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def keys(self, folder):
+        pages = self.client.get_paginator('list_objects_v2').paginate(Bucket=self.bucket, Prefix=folder + '/')
+        for page in pages:
+            for item in page.get('Contents', []):
+                yield item['Key']
+
+    def url(self, key, expires_in=None):
+        if self.public_url and expires_in is None:
+            return self.public_url.rstrip('/') + '/' + key
+        return self.client.generate_presigned_url('get_object', Params={'Bucket': self.bucket, 'Key': key},
+                                                  ExpiresIn=expires_in or 3600)
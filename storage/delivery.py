@@ -0,0 +1,101 @@
+"""
+File delivery. The bytes of a file are best sent by the web server in front of the app, so the workers only decide
+which file to send:
+
+    - with X_ACCEL_REDIRECT_PREFIX set, nginx is told the file in an X-Accel-Redirect header, the prefix being an
+      internal location aliased to the root of the app;
+    - with USE_X_SENDFILE set, Apache or lighttpd is told the file in an X-Sendfile header;
+    - otherwise the file is streamed by Flask, which answers Range, If-None-Match and If-Modified-Since requests.
+
+Files of a remote storage backend are not sent by the app at all, clients are redirected to the backend.
+"""
+import mimetypes
+import os
+from urllib.parse import quote
+
+from flask import current_app, redirect, send_file
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+
+from .backends import IMAGES, get_storage
+
+# how long the signed URLs clients are redirected to for private files are valid
+SIGNED_URL_EXPIRY = 5 * 60
+
+
+def x_accel_redirect(path, mimetype, as_attachment, download_name, max_age):
+    relative = os.path.relpath(path, current_app.root_path)
+    if relative.startswith(os.pardir):
+        return None
+    response = current_app.response_class(
+        mimetype=mimetype or mimetypes.guess_type(path)[0] or 'application/octet-stream')
+    prefix = current_app.config['X_ACCEL_REDIRECT_PREFIX'].rstrip('/')
+    response.headers['X-Accel-Redirect'] = '{}/{}'.format(prefix, quote(relative.replace(os.sep, '/')))
+    if as_attachment:
+        response.headers.set('Content-Disposition', 'attachment', filename=download_name or os.path.basename(path))
+    # nginx keeps these headers of the redirecting response, and does ranges and validators itself
+    if max_age is None:
+        response.cache_control.no_cache = True
+    else:
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+    return response
+
+
+def deliver(path, mimetype=None, as_attachment=False, download_name=None, max_age=None):
+    """
+    Returns the response sending the file at path, relative to the working directory or absolute.
+
+    :raises NotFound: if there is no such file.
+    """
+    path = os.path.abspath(path)
+    if not os.path.isfile(path):
+        raise NotFound()
+    if current_app.config.get('X_ACCEL_REDIRECT_PREFIX'):
+        response = x_accel_redirect(path, mimetype, as_attachment, download_name, max_age)
+        if response is not None:
+            return response
+    # send_file does X-Sendfile itself when USE_X_SENDFILE is set
+    return send_file(path, mimetype=mimetype, as_attachment=as_attachment, download_name=download_name,
+                     conditional=True, etag=True, max_age=max_age)
+
+
+def deliver_stored(key, mimetype=None, as_attachment=False, download_name=None, max_age=None, private=False):
+    """
+    Returns the response sending the file stored under key by the storage backend, see :func:`deliver`.
+    Private files of a remote backend are redirected to through a signed URL, valid for SIGNED_URL_EXPIRY seconds.
+
+    :raises NotFound: if there is no such file.
+    """
+    storage = get_storage()
+    path = storage.local_path(key)
+    if path is None:
+        if not storage.exists(key):
+            raise NotFound()
+        return redirect(storage.url(key, expires_in=SIGNED_URL_EXPIRY if private else None))
+    return deliver(path, mimetype=mimetype, as_attachment=as_attachment, download_name=download_name,
+                   max_age=max_age)
+
+
+def image_url(name):
+    """
+    Returns the URL of the image name on Flask's static route, whatever the storage backend, see
+    :func:`send_static_file`. Unlike the signed URLs of a private bucket it never expires, so it can go into cached
+    responses.
+    """
+    return '{}/{}/{}'.format(current_app.static_url_path, IMAGES, name)
+
+
+def send_static_file(filename):
+    """
+    Replaces the view of Flask's static route, so static files are delivered like any other, see :func:`deliver`.
+    /static/images/<name> is the URL of images/<name> of the local storage backend, wherever the file is stored.
+    """
+    max_age = current_app.get_send_file_max_age(filename)
+    folder, _, name = filename.partition('/')
+    if folder == IMAGES and name and '/' not in name:
+        return deliver_stored(filename, max_age=max_age)
+    path = safe_join(current_app.static_folder, filename)
+    if path is None:
+        raise NotFound()
+    return deliver(path, max_age=max_age)
@@ -0,0 +1,41 @@
+"""
+flask migrate-storage: moves the images and exports stored before the storage backends, directly in
+static/images and static/products, into the configured backend.
+"""
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from .backends import FOLDERS, LocalStorage, get_storage
+
+
+def copy_folder(source, target, folder):
+    """
+    Copies the files of folder missing in target from source.
+
+    :return: the number of files copied.
+    """
+    copied = 0
+    for key in source.keys(folder):
+        if not target.exists(key):
+            with source.open(key) as f:
+                target.put(key, f)
+            copied += 1
+    return copied
+
+
+@click.command('migrate-storage')
+@click.option('--source', default=None, help='Directory the files are in, STORAGE_ROOT by default.')
+@with_appcontext
+def migrate_storage_command(source):
+    """
+    Moves existing files into the layout of the configured storage backend. Local files are moved into their
+    hash-prefixed subdirectories; with a remote backend they are copied to it and left where they are.
+    """
+    storage = get_storage()
+    source = source or current_app.config['STORAGE_ROOT']
+    for folder in FOLDERS:
+        if isinstance(storage, LocalStorage) and storage.root == source:
+            click.echo('{}: {} files moved'.format(folder, storage.reshard(folder)))
+        else:
+            click.echo('{}: {} files copied'.format(folder, copy_folder(LocalStorage(source), storage, folder)))
@@ -0,0 +1,111 @@
+"""
+Resized variants of product images, made on demand and kept in a disk cache bounded in size, which evicts the least
+recently used variants first. Concurrent requests for the same variant, from any thread or process, wait for a single
+resize instead of all making it.
+"""
+import contextlib
+import fcntl
+import hashlib
+import io
+import os
+
+from PIL import Image, ImageOps
+from werkzeug.exceptions import NotFound
+
+from . import IMAGES, get_storage, key, write_once
+from .delivery import deliver
+
+WIDTHS = (64, 128, 256, 512, 1024)
+FORMATS = {
+    'webp': 'image/webp',
+    'png': 'image/png',
+    'jpeg': 'image/jpeg',
+}
+# variants share this many lock files, so requests for the same variant always take the same lock
+LOCK_STRIPES = 64
+# eviction goes below the limit, so it does not run again on the very next miss
+EVICTION_TARGET = 0.9
+# times a variant evicted before it could be delivered is made again
+DELIVERY_ATTEMPTS = 2
+
+
+@contextlib.contextmanager
+def locked(directory, name):
+    lock_dir = os.path.join(directory, 'locks')
+    os.makedirs(lock_dir, exist_ok=True)
+    stripe = int(hashlib.sha1(name.encode()).hexdigest(), 16) % LOCK_STRIPES
+    with open(os.path.join(lock_dir, '{}.lock'.format(stripe)), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def resize(source_name, width, image_format):
+    with get_storage().open(key(IMAGES, source_name)) as f, Image.open(f) as image:
+        image = ImageOps.exif_transpose(image)
+        if image_format == 'jpeg' or image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGB' if image_format == 'jpeg' else 'RGBA')
+        # never upscaled
+        image.thumbnail((width, image.height))
+        buffer = io.BytesIO()
+        image.save(buffer, format=image_format.upper())
+        return buffer.getvalue()
+
+
+def evict(directory, max_bytes):
+    files = []
+    for entry in os.scandir(directory):
+        if entry.is_file() and not entry.name.endswith('.tmp'):
+            stat = entry.stat()
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in files)
+    if total <= max_bytes:
+        return
+    for _, size, path in sorted(files):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # evicted by a concurrent request
+            pass
+        total -= size
+        if total <= max_bytes * EVICTION_TARGET:
+            break
+
+
+def get_variant(source_name, width, image_format, directory, max_bytes):
+    """
+    Returns the path of source_name resized to width in image_format, resizing it only if it is not cached yet.
+    The modification time of a variant is its last use, which is what eviction goes by.
+    """
+    os.makedirs(directory, exist_ok=True)
+    name = '{}_{}.{}'.format(os.path.splitext(source_name)[0], width, image_format)
+    path = os.path.join(directory, name)
+    try:
+        os.utime(path)
+        return path
+    except FileNotFoundError:
+        pass
+    with locked(directory, name):
+        # made by the request holding the lock before us
+        if not os.path.exists(path):
+            write_once(directory, name, resize(source_name, width, image_format))
+            evict(directory, max_bytes)
+    return path
+
+
+def deliver_variant(source_name, width, image_format, directory, max_bytes, max_age=None):
+    """
+    Returns the response sending a variant, see :func:`get_variant`. A variant evicted by a concurrent request after
+    it was made and before it could be opened is made again.
+
+    :raises NotFound: if the variant was evicted on every attempt.
+    """
+    for _ in range(DELIVERY_ATTEMPTS):
+        path = get_variant(source_name, width, image_format, directory, max_bytes)
+        try:
+            return deliver(path, mimetype=FORMATS[image_format], max_age=max_age)
+        except NotFound:
+            pass
+    raise NotFound()
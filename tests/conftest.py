@@ -0,0 +1,97 @@
+"""
+The app is imported once for the whole run, with a primary and a replica SQLite database in a temporary directory.
+That directory is also the working directory of the tests, so the files they store and the logs they write stay out of
+the repository. The replica lags behind the primary until a test calls replicate(), and the cache is an in-process
+SimpleCache, so no Redis is needed.
+"""
+import contextlib
+import itertools
+import os
+import sqlite3
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKDIR = tempfile.mkdtemp(prefix='grocery-tests-')
+PRIMARY = os.path.join(WORKDIR, 'primary.sqlite')
+REPLICA = os.path.join(WORKDIR, 'replica.sqlite')
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + PRIMARY
+os.environ['DATABASE_REPLICA_URL'] = 'sqlite:///' + REPLICA
+sys.path.insert(0, ROOT)
+os.chdir(WORKDIR)
+
+from flask_jwt_extended import create_access_token  # noqa: E402
+
+from app import app as flask_app  # noqa: E402
+from cache import cache  # noqa: E402
+from database import db  # noqa: E402
+from database.models import Product, Role, User  # noqa: E402
+
+cache.init_app(flask_app, config={'CACHE_TYPE': 'SimpleCache'})
+names = itertools.count()
+
+
+def replicate():
+    """
+    Brings the replica up to date with the primary.
+    """
+    with contextlib.closing(sqlite3.connect(PRIMARY)) as primary, \
+            contextlib.closing(sqlite3.connect(REPLICA)) as replica:
+        primary.backup(replica)
+
+
+@pytest.fixture
+def app():
+    return flask_app
+
+
+@pytest.fixture
+def client():
+    return flask_app.test_client()
+
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    cache.clear()
+    yield
+    db.session.remove()
+
+
+@pytest.fixture
+def make_user():
+    def make(role_name='user'):
+        number = next(names)
+        role = Role.query.filter_by(role_name=role_name).first()
+        user = User('{}{}'.format(role_name, number), 'Password123', '{}{}@example.com'.format(role_name, number),
+                    role.id)
+        db.session.add(user)
+        db.session.commit()
+        return user
+
+    return make
+
+
+@pytest.fixture
+def auth():
+    def headers(user):
+        with flask_app.test_request_context():
+            token = create_access_token(identity=user.id, additional_claims={'role': user.role.role_name})
+        return {'Authorization': 'Bearer ' + token}
+
+    return headers
+
+
+@pytest.fixture
+def make_product(make_user):
+    def make(stock=50, manager=None, category_id=1):
+        manager = manager or make_user('manager')
+        product = Product('product{}'.format(next(names)), 2.5, 'kg', 'a product for the tests', manager.id,
+                          category_id, current_stock=stock)
+        db.session.add(product)
+        db.session.commit()
+        return product
+
+    return make
@@ -0,0 +1,108 @@
+from datetime import timedelta
+
+import pytest
+from flask_jwt_extended import create_access_token
+
+from conftest import replicate
+from database.models import Category, Order
+
+CATEGORY_VIEWS = ('/api/user/get_categories', '/api/user/get_category/1')
+
+
+def test_orders_leave_category_etags_alone(client, make_user, make_product, auth):
+    product = make_product()
+    replicate()
+    etags = {url: client.get(url).headers['ETag'] for url in CATEGORY_VIEWS}
+    catalog_etag = client.get('/api/user/get_products').headers['ETag']
+
+    response = client.post('/api/order/place_order', json={'product_id': product.id, 'quantity': 1},
+                           headers=auth(make_user()))
+    assert response.status_code == 201
+
+    for url, etag in etags.items():
+        poll = client.get(url, headers={'If-None-Match': etag})
+        assert poll.status_code == 304
+        assert poll.headers['ETag'] == etag
+    assert client.get('/api/user/get_products').headers['ETag'] != catalog_etag
+
+
+def test_category_changes_invalidate_category_etags(client, make_user, auth):
+    admin = auth(make_user('admin'))
+    listing = client.get('/api/user/get_categories').headers['ETag']
+
+    response = client.post('/api/admin/create_category',
+                           json={'category_name': 'vegetables', 'category_description': 'fresh vegetables'},
+                           headers=admin)
+    assert response.status_code == 201
+    replicate()
+    assert client.get('/api/user/get_categories', headers={'If-None-Match': listing}).status_code == 200
+
+    category = Category.query.filter_by(category_name='vegetables').first()
+    url = '/api/user/get_category/{}'.format(category.id)
+    etag = client.get(url).headers['ETag']
+    response = client.put('/api/admin/update_category/{}'.format(category.id),
+                          json={'category_name': 'vegetables', 'category_description': 'green vegetables'},
+                          headers=admin)
+    assert response.status_code == 200
+    replicate()
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 200
+
+
+def bearer(app, user, role='user', expires_delta=None):
+    with app.test_request_context():
+        token = create_access_token(identity=user.id, additional_claims={'role': role}, expires_delta=expires_delta)
+    return {'Authorization': 'Bearer ' + token}
+
+
+@pytest.fixture
+def customers(make_user, make_product):
+    """
+    Two users, each with an unconfirmed order; only the first one also has a confirmed order.
+    """
+    product = make_product()
+    first, second = make_user(), make_user()
+    order = Order(product.id, first.id, 1)
+    Order(product.id, first.id, 2).confirm()
+    Order(product.id, second.id, 3)
+    replicate()
+    return first, second, order.id
+
+
+def per_identity_views(order_id):
+    return ('/api/user/', '/api/order/get_order/{}'.format(order_id), '/api/order/unconfirmed',
+            '/api/order/confirmed')
+
+
+def test_cached_responses_are_only_served_to_their_caller(app, client, customers):
+    first, second, order_id = customers
+    warm = {url: client.get(url, headers=bearer(app, first)) for url in per_identity_views(order_id)}
+    assert all(response.status_code == 200 for response in warm.values())
+
+    responses = {url: client.get(url, headers=bearer(app, second)) for url in per_identity_views(order_id)}
+    assert responses['/api/user/'].get_json()['username'] == second.username
+    assert responses['/api/order/get_order/{}'.format(order_id)].status_code == 403
+    assert [order['quantity'] for order in responses['/api/order/unconfirmed'].get_json()['orders']] == [3]
+    assert responses['/api/order/confirmed'].status_code == 404
+
+    for url, response in warm.items():
+        assert client.get(url, headers=bearer(app, first)).get_data() == response.get_data()
+
+
+def test_cached_responses_are_only_served_to_their_role(app, client, customers):
+    first, _, order_id = customers
+    for url in per_identity_views(order_id)[1:]:
+        assert client.get(url, headers=bearer(app, first)).status_code == 200
+        assert client.get(url, headers=bearer(app, first, role='manager')).status_code == 403
+
+
+def test_invalid_tokens_never_reach_cached_responses(app, client, customers):
+    first, _, order_id = customers
+    valid = bearer(app, first)
+    header, payload, signature = valid['Authorization'].split('.')
+    forged = {'Authorization': '.'.join((header, payload, signature[::-1]))}
+    expired = bearer(app, first, expires_delta=timedelta(seconds=-1))
+    for url in per_identity_views(order_id):
+        assert client.get(url, headers=valid).status_code == 200
+        assert client.get(url, headers=forged).status_code in (401, 422)
+        assert client.get(url, headers=expired).status_code == 401
+        assert client.get(url).status_code == 401
@@ -0,0 +1,120 @@
+from datetime import date
+
+import pytest
+
+from conftest import names, replicate
+from database import db
+from database.models import Category
+
+# rate, stock, expiry date of the products of the catalog fixture
+PRODUCTS = [
+    (None, 5, date(2030, 1, 1)),
+    (2.0, 0, None),
+    (None, 0, date(2029, 6, 1)),
+    (1.0, 3, date(2030, 1, 1)),
+    (2.0, 8, date(2028, 1, 1)),
+    (3.5, 1, None),
+]
+
+
+@pytest.fixture
+def catalog(make_user, make_product):
+    """
+    Products of a category of their own, some without a rate or an expiry date, as {id: product}.
+    """
+    category = Category('catalog{}'.format(next(names)), 'a category of products to page through')
+    db.session.add(category)
+    db.session.commit()
+    manager = make_user('manager')
+    products = {}
+    for rate, stock, expiry_date in PRODUCTS:
+        product = make_product(stock=stock, manager=manager, category_id=category.id)
+        product.rate = rate
+        product.expiry_date = expiry_date
+        products[product.id] = product
+    db.session.commit()
+    replicate()
+    return category.id, products
+
+
+def page_through(client, query, limit=2):
+    """
+    Returns the ids of every product listed by following next_cursor from the first page.
+    """
+    ids = []
+    url = '/api/user/get_products?limit={}&{}'.format(limit, query)
+    response = client.get(url)
+    while response.status_code == 200:
+        body = response.get_json()
+        assert len(body['products']) <= limit
+        ids += [product['id'] for product in body['products']]
+        if body['next_cursor'] is None:
+            return ids
+        response = client.get('{}&cursor={}'.format(url, body['next_cursor']))
+    assert response.status_code == 404 and not ids, response.get_json()
+    return ids
+
+
+def sort_key(sort):
+    def key(product):
+        value = getattr(product, sort)
+        # NULLs first, as in ascending order
+        return (value is not None, value if value is not None else 0, product.id)
+
+    return key
+
+
+@pytest.mark.parametrize('order', ['asc', 'desc'])
+@pytest.mark.parametrize('sort', ['id', 'name', 'rate', 'expiry_date'])
+def test_cursors_reach_every_product_once(client, catalog, sort, order):
+    category_id, products = catalog
+    expected = [product.id for product in sorted(products.values(), key=sort_key(sort))]
+    if order == 'desc':
+        expected.reverse()
+    query = 'category_id={}&sort={}&order={}'.format(category_id, sort, order)
+    assert page_through(client, query) == expected
+    assert page_through(client, query, limit=1) == expected
+    assert page_through(client, query, limit=100) == expected
+
+
+@pytest.mark.parametrize('query, keep', [
+    ('min_rate=2', lambda product: product.rate is not None and product.rate >= 2),
+    ('max_rate=2', lambda product: product.rate is not None and product.rate <= 2),
+    ('min_rate=1.5&max_rate=3', lambda product: product.rate is not None and 1.5 <= product.rate <= 3),
+    ('in_stock=true', lambda product: product.current_stock > 0),
+    ('expires_after=2029-12-31', lambda product: product.expiry_date and product.expiry_date >= date(2029, 12, 31)),
+    ('expires_before=2029-12-31', lambda product: product.expiry_date and product.expiry_date <= date(2029, 12, 31)),
+    ('min_rate=100', lambda product: False),
+])
+def test_filters(client, catalog, query, keep):
+    category_id, products = catalog
+    expected = [product_id for product_id, product in sorted(products.items()) if keep(product)]
+    assert page_through(client, 'category_id={}&{}'.format(category_id, query)) == expected
+    assert page_through(client, 'category_id={}&sort=rate&{}'.format(category_id, query)) == sorted(
+        expected, key=lambda product_id: sort_key('rate')(products[product_id]))
+
+
+def test_categories_do_not_mix(client, catalog, make_product):
+    category_id, products = catalog
+    make_product()
+    replicate()
+    assert page_through(client, 'category_id={}'.format(category_id)) == sorted(products)
+
+
+@pytest.mark.parametrize('query', [
+    'sort=price',
+    'order=up',
+    'limit=0',
+    'limit=101',
+    'limit=two',
+    'category_id=fruits',
+    'min_rate=cheap',
+    'expires_after=2030-13-01',
+    'expires_before=tomorrow',
+    'cursor=not-a-cursor',
+    'sort=expiry_date&cursor=WyJzb29uIiwgMV0=',
+])
+def test_bad_input_is_a_400(client, query):
+    response = client.get('/api/user/get_products?' + query)
+    assert response.status_code == 400
+    assert response.get_json()['message']
@@ -0,0 +1,134 @@
+import io
+import struct
+import zlib
+
+import pytest
+from PIL import Image, ImageFile
+
+from conftest import names, replicate
+from database import db
+from database.models import Category, ProductImage
+from scheduled_jobs.images import process_product_image
+from storage import IMAGES, get_storage, key
+
+
+def png(width=32, height=32):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), (200, 30, 30)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def chunk(chunk_type, data):
+    return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(chunk_type + data))
+
+
+def png_header(width, height):
+    """
+    A PNG of a few bytes declaring width x height pixels, without any pixel data.
+    """
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', b'') + chunk(b'IEND', b''))
+
+
+@pytest.fixture
+def category():
+    category = Category('images{}'.format(next(names)), 'a category of products with images')
+    db.session.add(category)
+    db.session.commit()
+    return category
+
+
+@pytest.fixture
+def pending_image():
+    name = 'upload{}.png'.format(next(names))
+    get_storage().put(key(IMAGES, name), io.BytesIO(png(400, 200)))
+    image = ProductImage(name, original_name=name, status='pending')
+    db.session.add(image)
+    db.session.commit()
+    return image
+
+
+def test_processed_images_change_the_catalog_etag(client, category, pending_image, make_product):
+    product = make_product(category_id=category.id)
+    product.image_id = pending_image.id
+    db.session.commit()
+    image_id = pending_image.id
+    replicate()
+    url = '/api/user/get_products?category_id={}'.format(category.id)
+    response = client.get(url)
+    assert response.get_json()['products'][0]['image']['status'] == 'pending'
+
+    process_product_image.run(image_id)
+    db.session.remove()
+
+    poll = client.get(url, headers={'If-None-Match': response.headers['ETag']})
+    assert poll.status_code == 200
+    assert poll.headers['ETag'] != response.headers['ETag']
+    image = poll.get_json()['products'][0]['image']
+    assert image['status'] == 'ready'
+    assert image['image_name'] == image['renditions']['listing']['png']
+
+
+@pytest.fixture
+def upload(client, make_user, auth, monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError('pixels decoded while validating an upload')
+
+    # the pixels are only ever decoded by the worker making the renditions
+    monkeypatch.setattr(ImageFile.ImageFile, 'load', fail)
+    manager = auth(make_user('manager'))
+
+    def post(data, filename='upload.png', content_type='image/png'):
+        return client.post('/api/image/upload', data={'image': (io.BytesIO(data), filename, content_type)},
+                           content_type='multipart/form-data', headers=manager)
+
+    return post
+
+
+def test_valid_images_are_uploaded(upload):
+    response = upload(png(64, 48))
+    assert response.status_code == 201
+    assert response.get_json()['image']['status'] == 'pending'
+    assert upload(png(64, 48)).status_code == 200
+
+
+def test_requests_above_max_content_length_are_a_413(app, upload):
+    response = upload(png() + b'\0' * app.config['MAX_CONTENT_LENGTH'])
+    assert response.status_code == 413
+
+
+def test_files_above_max_bytes_are_a_400(upload):
+    response = upload(png() + b'\0' * (5 * 1024 * 1024 // 2))
+    assert response.status_code == 400
+    assert 'Image file must be less than 2MB' in response.get_json()['message']
+
+
+@pytest.mark.parametrize('data, content_type', [
+    (b'GIF89a' + b'\0' * 64, 'image/png'),
+    (b'<svg xmlns="http://www.w3.org/2000/svg"></svg>', 'image/svg+xml'),
+    (b'\x89PNG\r\n\x1a\n' + b'\0' * 64, 'image/png'),
+    (png(), 'text/plain'),
+])
+def test_files_that_are_not_images_are_a_400(upload, data, content_type):
+    response = upload(data, content_type=content_type)
+    assert response.status_code == 400
+    assert 'image_file' in response.get_json()['message']
+
+
+@pytest.mark.parametrize('width, height', [
+    (6001, 10),
+    (10, 6001),
+    (5000, 5000),
+    (10000, 10000),
+    # past twice Pillow's MAX_IMAGE_PIXELS, opening it raises DecompressionBombError
+    (20000, 20000),
+])
+def test_oversized_images_are_rejected_from_their_header(upload, width, height):
+    response = upload(png_header(width, height))
+    assert response.status_code == 400
+    assert 'Image must be at most 6000x6000 pixels and 24000000 pixels in total' in response.get_json()['message']
+
+
+def test_images_within_the_limits_pass_validation(upload):
+    # the header is all the validation reads, the missing pixels are the worker's problem
+    assert upload(png_header(6000, 4000)).status_code == 201
@@ -0,0 +1,71 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, inspect
+
+from database import db
+from database.migrations import migrate
+from database.models import CategoryRequest, Order, Product
+
+HOT_QUERIES = {
+    'orders of a user by confirmation': (
+        db.select(Order).where(Order.user_id == 1, Order.confirmed == False), 'ix_order_user_id_confirmed'),
+    'orders placed since': (
+        db.select(Order).where(Order.order_time > datetime(2024, 1, 1)), 'ix_order_order_time'),
+    'orders of a product': (
+        db.select(Order).where(Order.product_id == 1), 'ix_order_product_id'),
+    'products of a manager': (
+        db.select(Product).where(Product.added_by == 1), 'ix_product_added_by'),
+    'pending category requests': (
+        db.select(CategoryRequest).where(CategoryRequest.approved == False), 'ix_category_request_approved'),
+}
+# what migration 2 added to product_image, missing from databases created before it
+PRODUCT_IMAGE_COLUMNS = ('original_name', 'status', 'renditions', 'uploaded_on')
+
+
+def create_fresh(engine):
+    db.metadata.create_all(engine)
+
+
+def create_migrated(engine):
+    """
+    Creates the schema as it was before the migrations, without the indexes nor the new product_image columns, and
+    upgrades it with migrate().
+    """
+    db.metadata.create_all(engine)
+    with engine.begin() as connection:
+        for table in inspect(connection).get_table_names():
+            for index in inspect(connection).get_indexes(table):
+                if index['name'].startswith('ix_'):
+                    connection.exec_driver_sql('DROP INDEX {}'.format(index['name']))
+        for column in PRODUCT_IMAGE_COLUMNS:
+            connection.exec_driver_sql('ALTER TABLE product_image DROP COLUMN {}'.format(column))
+        connection.exec_driver_sql('DROP TABLE schema_version')
+    migrate(engine)
+
+
+@pytest.fixture(scope='module', params=[create_fresh, create_migrated], ids=['fresh', 'migrated'])
+def engine(request, tmp_path_factory):
+    engine = create_engine('sqlite:///{}'.format(tmp_path_factory.mktemp('indexes') / 'database.sqlite'))
+    request.param(engine)
+    yield engine
+    engine.dispose()
+
+
+def query_plan(engine, statement):
+    compiled = statement.compile(dialect=engine.dialect)
+    parameters = tuple(compiled.params[name] for name in compiled.positiontup)
+    with engine.connect() as connection:
+        rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + str(compiled), parameters).all()
+    return '\n'.join(row[-1] for row in rows)
+
+
+@pytest.mark.parametrize('query', HOT_QUERIES)
+def test_hot_query_uses_its_index(engine, query):
+    statement, index = HOT_QUERIES[query]
+    assert 'USING INDEX {}'.format(index) in query_plan(engine, statement)
+
+
+def test_migrated_product_images_have_their_columns(engine):
+    columns = {column['name'] for column in inspect(engine).get_columns('product_image')}
+    assert set(PRODUCT_IMAGE_COLUMNS) <= columns
@@ -0,0 +1,60 @@
+import logging
+from datetime import date, timedelta
+
+import pytest
+
+from database.models import Order, Role, User
+from mail import reminder
+from scheduled_jobs import celery
+
+
+@pytest.fixture
+def recipients(make_user):
+    for _ in range(7):
+        make_user()
+    role = Role.query.filter_by(role_name='user').first()
+    return {user.email for user in User.query.filter_by(role_id=role.id)}
+
+
+def test_ranges_split_the_recipients_into_chunks(app, recipients):
+    ranges = reminder.recipient_ranges(3)
+    assert ranges[-1][1] is None
+    emails = []
+    for first_id, end_id in ranges:
+        chunk = [email for _, email, _ in reminder.unconfirmed_order_counts(first_id, end_id)]
+        assert 0 < len(chunk) <= 3
+        emails += chunk
+    assert len(ranges) == -(-len(recipients) // 3)
+    assert sorted(emails) == sorted(recipients)
+
+
+def test_chunks_query_their_own_rows(app, monkeypatch, make_user, make_product):
+    user = make_user()
+    make_user()
+    Order(make_product().id, user.id, 2)
+    messages = []
+
+    def send_many(chunk):
+        messages.extend(chunk)
+        return len(messages), 0
+
+    monkeypatch.setattr(reminder, 'send_many', send_many)
+    since = date.today() - timedelta(days=30)
+    assert reminder.send_mail_chunk.run('report', user.id, user.id + 1, since) == {'sent': 1, 'failed': 0}
+    assert [message.recipients for message in messages] == [[user.email]]
+    assert 'Please checkout' in messages[0].body
+
+
+def test_summaries_are_logged(caplog):
+    with caplog.at_level(logging.INFO, logger='error_log'):
+        summary = reminder.mail_summary.run([{'sent': 3, 'failed': 0}, {'sent': 1, 'failed': 1}], 'report')
+    assert summary == {'kind': 'report', 'chunks': 2, 'sent': 4, 'failed': 1}
+    assert [(record.levelno, record.getMessage()) for record in caplog.records] == [
+        (logging.WARNING, 'report mail sent: 4 sent, 1 failed in 2 chunks')]
+
+
+def test_fan_out_returns_a_task_id_without_recipients(app, monkeypatch):
+    monkeypatch.setitem(celery.conf, 'task_always_eager', True)
+    monkeypatch.setattr(reminder, 'recipient_ranges', lambda chunk_size: [])
+    task_id = reminder.fan_out('reminder')
+    assert isinstance(task_id, str) and task_id
@@ -0,0 +1,83 @@
+import pytest
+
+from database import db
+from database.models import Order, Product
+
+
+def test_place_many_reserves_each_product_once_in_id_order(monkeypatch, make_user, make_product):
+    first, second = make_product(stock=10), make_product(stock=10)
+    reserved = []
+    reserve_stock = Product.reserve_stock
+
+    def recording(product_id, quantity):
+        reserved.append((product_id, quantity))
+        reserve_stock(product_id, quantity)
+
+    monkeypatch.setattr(Product, 'reserve_stock', staticmethod(recording))
+    items = [{'product_id': second.id, 'quantity': 2},
+             {'product_id': first.id, 'quantity': 1},
+             {'product_id': second.id, 'quantity': 3}]
+    order_ids = Order.place_many(make_user().id, items)
+
+    assert reserved == [(first.id, 1), (second.id, 5)]
+    assert len(order_ids) == 3
+    assert db.session.get(Product, first.id).current_stock == 9
+    assert db.session.get(Product, second.id).current_stock == 5
+
+
+def test_place_many_is_all_or_nothing(make_user, make_product):
+    first, second = make_product(stock=10), make_product(stock=4)
+    user = make_user()
+    items = [{'product_id': first.id, 'quantity': 1},
+             {'product_id': second.id, 'quantity': 3},
+             {'product_id': second.id, 'quantity': 2}]
+
+    with pytest.raises(ValueError):
+        Order.place_many(user.id, items)
+
+    assert Order.query.filter_by(user_id=user.id).count() == 0
+    assert db.session.get(Product, first.id).current_stock == 10
+    assert db.session.get(Product, second.id).current_stock == 4
+
+
+@pytest.fixture
+def cart(make_user, make_product):
+    """
+    A user with two unconfirmed orders of apples, one of pears and a confirmed one of apples, next to the
+    unconfirmed order of another user.
+    """
+    apples, pears = make_product(stock=20), make_product(stock=20)
+    user, other = make_user(), make_user()
+    Order(apples.id, user.id, 2)
+    Order(apples.id, user.id, 3)
+    Order(pears.id, user.id, 4)
+    Order(apples.id, user.id, 1).confirm()
+    Order(pears.id, other.id, 5)
+    return user, other, apples.id, pears.id
+
+
+def test_cancel_all_restocks_the_unconfirmed_orders(cart):
+    user, other, apples, pears = cart
+    assert db.session.get(Product, apples).current_stock == 14
+    assert db.session.get(Product, pears).current_stock == 11
+
+    products = Order.cancel_all(user.id)
+    db.session.expire_all()
+    assert sorted(product.id for product in products) == [apples, pears]
+    assert db.session.get(Product, apples).current_stock == 19
+    assert db.session.get(Product, pears).current_stock == 15
+    assert [(order.product_id, order.quantity, order.confirmed)
+            for order in Order.query.filter_by(user_id=user.id)] == [(apples, 1, True)]
+    assert Order.query.filter_by(user_id=other.id).count() == 1
+    assert Order.cancel_all(user.id) == []
+
+
+def test_confirm_all_confirms_the_unconfirmed_orders(cart):
+    user, other, apples, pears = cart
+    assert Order.confirm_all(user.id) == 3
+    assert Order.query.filter_by(user_id=user.id, confirmed=False).count() == 0
+    assert Order.query.filter_by(user_id=other.id, confirmed=False).count() == 1
+    assert Order.cancel_all(user.id) == []
+    db.session.expire_all()
+    assert db.session.get(Product, apples).current_stock == 14
+    assert db.session.get(Product, pears).current_stock == 11
@@ -0,0 +1,103 @@
+import pytest
+from flask import request
+from sqlalchemy import event
+
+from api import primary_key
+from cache import cache
+from conftest import replicate
+from database import db
+from database.models import Category
+from database.routing import REPLICA
+
+
+@pytest.fixture
+def reads(app):
+    """
+    Records the engine, 'primary' or 'replica', of every statement run during the test.
+    """
+    statements = []
+    engines = {'primary': db.engine, 'replica': db.engines[REPLICA]}
+
+    def recorder(name):
+        def record(conn, cursor, statement, *args):
+            statements.append((name, statement.split(None, 1)[0].upper()))
+
+        return record
+
+    listeners = [(engine, recorder(name)) for name, engine in engines.items()]
+    for engine, listener in listeners:
+        event.listen(engine, 'before_cursor_execute', listener)
+    yield statements
+    for engine, listener in listeners:
+        event.remove(engine, 'before_cursor_execute', listener)
+
+
+def engines_of(statements, kind):
+    return {name for name, statement in statements if statement == kind}
+
+
+def test_anonymous_read_only_views_read_the_replica(client, reads):
+    replicate()
+    assert client.get('/api/user/get_categories').status_code == 200
+    assert engines_of(reads, 'SELECT') == {'replica'}
+
+
+def test_writers_read_the_primary_within_the_window(client, make_user, make_product, auth, reads):
+    product = make_product()
+    user = auth(make_user())
+    replicate()
+    reads.clear()
+    # a query string of its own keeps each read out of the responses cached by the previous ones
+    client.get('/api/user/get_categories?before', headers=user)
+    assert engines_of(reads, 'SELECT') == {'replica'}
+
+    response = client.post('/api/order/place_order', json={'product_id': product.id, 'quantity': 1}, headers=user)
+    assert response.status_code == 201
+    reads.clear()
+    client.get('/api/user/get_categories?after', headers=user)
+    assert engines_of(reads, 'SELECT') == {'primary'}
+
+    reads.clear()
+    client.get('/api/user/get_categories?anonymous')
+    assert engines_of(reads, 'SELECT') == {'replica'}
+
+
+def test_invalidated_views_read_the_primary_within_the_window(client, make_user, auth, reads):
+    admin = auth(make_user('admin'))
+    replicate()
+    response = client.post('/api/admin/create_category',
+                           json={'category_name': 'fruits', 'category_description': 'fresh fruits'}, headers=admin)
+    assert response.status_code == 201
+    category_id = Category.query.filter_by(category_name='fruits').first().id
+    db.session.remove()
+    reads.clear()
+
+    # the replica has not seen the category yet, the response cached under the new version must come from the primary
+    response = client.get('/api/user/get_category/{}'.format(category_id))
+    assert response.status_code == 200
+    assert engines_of(reads, 'SELECT') == {'primary'}
+    assert client.get('/api/user/get_categories').get_json()['categories'][-1]['category_name'] == 'fruits'
+
+
+def test_flushes_of_read_only_requests_go_to_the_primary(app, reads):
+    with app.test_request_context():
+        request.read_only = True
+        category = Category('flushed', 'a category written in a read-only request')
+        db.session.add(category)
+        db.session.flush()
+        assert engines_of(reads, 'INSERT') == {'primary'}
+        db.session.rollback()
+
+        Category.query.all()
+        assert engines_of(reads, 'SELECT') == {'replica'}
+
+
+def test_requests_without_a_token_do_not_stick_anyone_to_the_primary(client, make_user, auth):
+    reader = make_user()
+    client.get('/api/user/get_categories', headers=auth(reader))
+    user = make_user()
+
+    response = client.post('/api/login/user', json={'username': user.username, 'password': 'Password123'})
+    assert response.status_code == 200
+    assert cache.get(primary_key(reader.id)) is None
+    assert cache.get(primary_key(user.id)) is None
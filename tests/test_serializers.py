@@ -0,0 +1,37 @@
+import pytest
+from flask import jsonify
+
+from database import db, loaders
+from database.models import Category, Order, Product, ProductImage
+from database.schema import CategorySchema, OrderSchema, ProductSchema
+from database.serializers import category_serializer, json_response, order_serializer, product_serializer
+
+
+@pytest.fixture
+def catalog(make_user, make_product):
+    number = Category.query.count()
+    image = ProductImage('serialized{}.png'.format(number))
+    category = Category('serialized{}'.format(number), 'a category of serialized products')
+    db.session.add_all([image, category])
+    db.session.commit()
+    manager = make_user('manager')
+    user = make_user()
+    products = [make_product(manager=manager, category_id=category.id) for _ in range(5)]
+    products[0].image_id = image.id
+    db.session.commit()
+    for product in products[:3]:
+        Order(product.id, user.id, 2)
+
+
+@pytest.mark.parametrize('schema, serializer, query', [
+    (ProductSchema(), product_serializer, lambda: Product.query.options(*loaders.PRODUCT)),
+    (OrderSchema(), order_serializer, lambda: Order.query.options(*loaders.ORDER)),
+    (CategorySchema(), category_serializer, lambda: Category.query),
+], ids=['product', 'order', 'category'])
+def test_serializer_dumps_like_its_schema(app, catalog, schema, serializer, query):
+    rows = query().all()
+    assert rows
+    assert serializer.dump(rows, many=True) == schema.dump(rows, many=True)
+    assert serializer.dump(rows[0]) == schema.dump(rows[0])
+    assert (json_response({'rows': serializer.dump(rows, many=True)}).get_data()
+            == jsonify({'rows': schema.dump(rows, many=True)}).get_data())
@@ -0,0 +1,53 @@
+import threading
+
+from database import db
+from database.models import Order, Product
+
+WORKERS = 16
+ORDERS_PER_WORKER = 10
+STOCK = 50
+
+
+def test_parallel_orders_never_oversell(app, make_user, make_product):
+    product = make_product(stock=STOCK)
+    product_id = product.id
+    user_ids = [make_user().id for _ in range(WORKERS)]
+    placed = []
+    refused = []
+    lock = threading.Lock()
+
+    def worker(user_id):
+        for _ in range(ORDERS_PER_WORKER):
+            with app.app_context():
+                try:
+                    Order(product_id, user_id, 1)
+                    with lock:
+                        placed.append(user_id)
+                except ValueError:
+                    with lock:
+                        refused.append(user_id)
+                finally:
+                    db.session.remove()
+
+    threads = [threading.Thread(target=worker, args=(user_id,)) for user_id in user_ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(placed) == STOCK
+    assert len(refused) == WORKERS * ORDERS_PER_WORKER - STOCK
+    assert Order.query.filter_by(product_id=product_id).count() == STOCK
+    assert db.session.get(Product, product_id).current_stock == 0
+
+
+def test_update_and_delete_return_stock(make_user, make_product):
+    product = make_product(stock=10)
+    order = Order(product.id, make_user().id, 4)
+    assert db.session.get(Product, product.id).current_stock == 6
+
+    order.update(2)
+    assert db.session.get(Product, product.id).current_stock == 8
+
+    order.delete()
+    assert db.session.get(Product, product.id).current_stock == 10
@@ -0,0 +1,142 @@
+import io
+import os
+
+import pytest
+
+from database.models import ProductImage
+from database.schema import ProductImageSchema
+from storage import EXPORTS, IMAGES
+from storage.backends import LocalStorage, S3Storage
+
+BUCKET = 'grocery-tests'
+PUBLIC_URL = 'https://cdn.example.com/grocery'
+HASHED = '{}.png'.format('ab' * 32)
+
+
+@pytest.fixture
+def s3_client(monkeypatch):
+    moto = pytest.importorskip('moto')
+    boto3 = pytest.importorskip('boto3')
+    for name, value in (('AWS_ACCESS_KEY_ID', 'testing'), ('AWS_SECRET_ACCESS_KEY', 'testing'),
+                        ('AWS_DEFAULT_REGION', 'us-east-1')):
+        monkeypatch.setenv(name, value)
+    with moto.mock_aws():
+        client = boto3.client('s3')
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+@pytest.fixture(params=['local', 's3'])
+def storage(request, tmp_path):
+    if request.param == 'local':
+        return LocalStorage(str(tmp_path))
+    return S3Storage(BUCKET, public_url=PUBLIC_URL, client=request.getfixturevalue('s3_client'))
+
+
+def test_storage_contract(storage):
+    image = '{}/apple.png'.format(IMAGES)
+    export = '{}/1.csv'.format(EXPORTS)
+    assert not storage.exists(image)
+    assert list(storage.keys(IMAGES)) == []
+
+    storage.put(image, io.BytesIO(b'first'))
+    storage.put(export, io.BytesIO(b'id,name\n'))
+    assert storage.exists(image)
+    with storage.open(image) as f:
+        assert f.read() == b'first'
+    storage.put(image, io.BytesIO(b'second'))
+    with storage.open(image) as f:
+        assert f.read() == b'second'
+    assert list(storage.keys(IMAGES)) == [image]
+    assert list(storage.keys(EXPORTS)) == [export]
+    assert storage.url(image).endswith('/' + image)
+
+    storage.delete(image)
+    storage.delete(image)
+    assert not storage.exists(image)
+    assert list(storage.keys(IMAGES)) == []
+    assert storage.exists(export)
+
+
+def test_s3_urls_are_public_or_signed(s3_client):
+    storage = S3Storage(BUCKET, public_url=PUBLIC_URL, client=s3_client)
+    assert storage.url('images/apple.png') == PUBLIC_URL + '/images/apple.png'
+    signed = storage.url('products/1.csv', expires_in=300)
+    assert '/products/1.csv?' in signed and 'Signature' in signed
+
+
+def test_s3_stores_hashed_names_as_immutable(s3_client):
+    storage = S3Storage(BUCKET, client=s3_client)
+    storage.put('images/' + HASHED, io.BytesIO(b'hashed'))
+    storage.put('products/1.csv', io.BytesIO(b'id,name\n'))
+    hashed = s3_client.head_object(Bucket=BUCKET, Key='images/' + HASHED)
+    assert hashed['CacheControl'] == 'public, max-age=31536000, immutable'
+    assert hashed['ContentType'] == 'image/png'
+    assert 'CacheControl' not in s3_client.head_object(Bucket=BUCKET, Key='products/1.csv')
+
+
+def test_image_paths_do_not_expire_with_a_private_bucket(app, client, monkeypatch, s3_client):
+    storage = S3Storage(BUCKET, client=s3_client)
+    monkeypatch.setitem(app.extensions, 'storage', storage)
+    storage.put('images/' + HASHED, io.BytesIO(b'hashed'))
+    path = ProductImageSchema.get_image_path(ProductImage(HASHED))
+    assert path == '/static/images/' + HASHED
+
+    response = client.get(path)
+    assert response.status_code == 302
+    assert '/images/{}?'.format(HASHED) in response.headers['Location']
+    assert 'Signature' in response.headers['Location']
+
+
+def test_local_storage_finds_flat_files_until_resharded(tmp_path):
+    storage = LocalStorage(str(tmp_path))
+    os.makedirs(tmp_path / IMAGES)
+    (tmp_path / IMAGES / 'apple.png').write_bytes(b'apple')
+    (tmp_path / IMAGES / '.gitkeep').write_bytes(b'')
+    assert storage.exists('images/apple.png')
+
+    assert storage.reshard(IMAGES) == 1
+    assert os.path.exists(storage.path('images/apple.png'))
+    assert not os.path.exists(tmp_path / IMAGES / 'apple.png')
+    assert os.path.exists(tmp_path / IMAGES / '.gitkeep')
+
+
+@pytest.fixture
+def legacy_files(tmp_path):
+    """
+    A static directory as it was before the storage backends, with the files directly in their folders.
+    """
+    for folder, name in ((IMAGES, 'apple.png'), (IMAGES, 'pear.png'), (EXPORTS, '1.csv')):
+        os.makedirs(tmp_path / folder, exist_ok=True)
+        (tmp_path / folder / name).write_bytes(name.encode())
+    return tmp_path
+
+
+def migrate_storage(app, monkeypatch, storage, source):
+    monkeypatch.setitem(app.extensions, 'storage', storage)
+    result = app.test_cli_runner().invoke(args=['migrate-storage', '--source', str(source)])
+    assert result.exit_code == 0, result.output
+    return result.output.splitlines()
+
+
+def test_migrate_storage_reshards_local_files(app, monkeypatch, legacy_files):
+    storage = LocalStorage(str(legacy_files))
+    assert migrate_storage(app, monkeypatch, storage, legacy_files) == ['images: 2 files moved',
+                                                                        'products: 1 files moved']
+    assert sorted(storage.keys(IMAGES)) == ['images/apple.png', 'images/pear.png']
+    assert os.path.exists(storage.path('products/1.csv'))
+    assert migrate_storage(app, monkeypatch, storage, legacy_files) == ['images: 0 files moved',
+                                                                        'products: 0 files moved']
+
+
+def test_migrate_storage_copies_local_files_to_s3(app, monkeypatch, legacy_files, s3_client):
+    storage = S3Storage(BUCKET, client=s3_client)
+    assert migrate_storage(app, monkeypatch, storage, legacy_files) == ['images: 2 files copied',
+                                                                        'products: 1 files copied']
+    assert sorted(storage.keys(IMAGES)) == ['images/apple.png', 'images/pear.png']
+    with storage.open('products/1.csv') as f:
+        assert f.read() == b'1.csv'
+    # the originals are left in place and copying again is a no-op
+    assert os.path.exists(legacy_files / IMAGES / 'apple.png')
+    assert migrate_storage(app, monkeypatch, storage, legacy_files) == ['images: 0 files copied',
+                                                                        'products: 0 files copied']
@@ -0,0 +1,114 @@
+import io
+import os
+import threading
+import time
+
+import pytest
+from PIL import Image
+
+from conftest import names
+from database import db
+from database.models import ProductImage
+from storage import IMAGES, get_storage, key, variants
+
+
+@pytest.fixture
+def source():
+    """
+    A 100x50 image in the storage backend, as {'name': ..., 'id': ...} of its ProductImage.
+    """
+    name = 'source{}.png'.format(next(names))
+    buffer = io.BytesIO()
+    Image.new('RGB', (100, 50), (30, 120, 30)).save(buffer, format='PNG')
+    get_storage().put(key(IMAGES, name), io.BytesIO(buffer.getvalue()))
+    image = ProductImage(name, original_name=name)
+    db.session.add(image)
+    db.session.commit()
+    return {'name': name, 'id': image.id}
+
+
+@pytest.fixture
+def fake_resize(monkeypatch):
+    """
+    Replaces resizing with 100 bytes made after a short pause, and records every resize.
+    """
+    calls = []
+
+    def resize(source_name, width, image_format):
+        calls.append((source_name, width, image_format))
+        time.sleep(0.05)
+        return b'\0' * 100
+
+    monkeypatch.setattr(variants, 'resize', resize)
+    return calls
+
+
+def test_concurrent_requests_wait_for_a_single_resize(tmp_path, fake_resize):
+    paths = []
+
+    def request():
+        paths.append(variants.get_variant('apple.png', 128, 'webp', str(tmp_path), 10 ** 6))
+
+    threads = [threading.Thread(target=request) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert fake_resize == [('apple.png', 128, 'webp')]
+    assert len(set(paths)) == 1 and os.path.getsize(paths[0]) == 100
+
+
+def test_least_recently_used_variants_are_evicted_first(tmp_path, fake_resize):
+    directory = str(tmp_path)
+    made = {name: variants.get_variant(name, 64, 'png', directory, 350) for name in ('a.png', 'b.png', 'c.png')}
+    for age, name in enumerate(('a.png', 'b.png', 'c.png')):
+        os.utime(made[name], (age, age))
+    # a hit makes a the most recently used
+    variants.get_variant('a.png', 64, 'png', directory, 350)
+
+    variants.get_variant('d.png', 64, 'png', directory, 350)
+    assert sorted(entry.name for entry in os.scandir(directory) if entry.is_file()) == ['a_64.png', 'c_64.png',
+                                                                                      'd_64.png']
+    assert len(fake_resize) == 4
+
+
+@pytest.mark.parametrize('width, size', [(64, (64, 32)), (512, (100, 50))])
+def test_variants_are_never_upscaled(app, source, width, size):
+    with Image.open(io.BytesIO(variants.resize(source['name'], width, 'png'))) as image:
+        assert image.size == size
+
+
+def test_resize_endpoint(app, client, source):
+    response = client.get('/api/image/{}/resize?width=64&format=webp'.format(source['id']))
+    assert response.status_code == 200
+    assert response.mimetype == 'image/webp'
+    with Image.open(io.BytesIO(response.get_data())) as image:
+        assert image.size == (64, 32)
+    assert client.get('/api/image/{}/resize?width=65'.format(source['id'])).status_code == 400
+    assert client.get('/api/image/{}/resize?width=64&format=gif'.format(source['id'])).status_code == 400
+    assert client.get('/api/image/0/resize?width=64').status_code == 404
+
+
+def test_variants_evicted_before_delivery_are_made_again(app, client, monkeypatch, source):
+    get_variant = variants.get_variant
+    evicted = []
+
+    def evicting(*args):
+        path = get_variant(*args)
+        if not evicted:
+            # evicted by a concurrent request between get_variant and deliver
+            os.remove(path)
+            evicted.append(path)
+        return path
+
+    monkeypatch.setattr(variants, 'get_variant', evicting)
+    response = client.get('/api/image/{}/resize?width=128&format=png'.format(source['id']))
+    assert evicted and response.status_code == 200
+    assert os.path.exists(evicted[0])
+
+
+def test_variants_that_cannot_be_delivered_are_a_404(app, client, monkeypatch, source, tmp_path):
+    monkeypatch.setattr(variants, 'get_variant', lambda *args: str(tmp_path / 'evicted.png'))
+    response = client.get('/api/image/{}/resize?width=128&format=png'.format(source['id']))
+    assert response.status_code == 404